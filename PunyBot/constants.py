@@ -1,7 +1,8 @@
 import os
 import yaml
 from disco.types.base import SlottedModel, snowflake, Field, text, ListField, DictField, AutoDictField
-from disco.util.config import Config as ConfigUtil
+
+from PunyBot.utils.templates import MessageTemplates
 
 with open(os.getcwd() + "/config/config.yaml", 'r') as f:
     config_values = yaml.load(f.read(), Loader=yaml.SafeLoader)
@@ -32,6 +33,11 @@ class MediaConfig(SlottedModel):
     twitter = DictField(text, TwitterConfig, default={})
     steam = DictField(text, SteamConfig, default={})
     rss = DictField(snowflake, ListField(text), default=[])
+    # Bounds (in seconds) for how often a single Steam app/RSS feed is polled.
+    poll_floor = Field(int, default=60)
+    poll_ceiling = Field(int, default=1800)
+    # Download and parse RSS feeds in a separate worker process instead of the bot's own event loop.
+    rss_worker_process = Field(bool, default=False)
 
 
 class AgreementConfig(SlottedModel):
@@ -68,4 +74,4 @@ class BaseConfig(SlottedModel):
 
 CONFIG = BaseConfig(config_values)
 
-Messages = ConfigUtil.from_file("./config/message_templates.yaml")
+Messages = MessageTemplates("./config/message_templates.yaml")
@@ -1,6 +1,7 @@
 import os
 
 from peewee import Model
+from playhouse.migrate import SqliteMigrator, migrate
 from playhouse.sqlite_ext import SqliteExtDatabase
 
 sqlite_db = SqliteExtDatabase(os.getcwd() + '/data/database.db', pragmas={'journal_mode': 'wal'})
@@ -8,6 +9,17 @@ sqlite_db = SqliteExtDatabase(os.getcwd() + '/data/database.db', pragmas={'journ
 REGISTERED_MODELS = []
 
 
+def add_missing_columns(cls):
+    # create_table() leaves existing tables alone, so fields added to a model later on are migrated in here.
+    # New fields need to be nullable or have a default for this to work.
+    existing = [column.name for column in sqlite_db.get_columns(cls._meta.table_name)]
+    missing = [field for field in cls._meta.sorted_fields if field.column_name not in existing]
+
+    if missing:
+        migrator = SqliteMigrator(sqlite_db)
+        migrate(*[migrator.add_column(cls._meta.table_name, field.column_name, field) for field in missing])
+
+
 class SQLiteBase(Model):
     class Meta:
         database = sqlite_db
@@ -15,6 +27,7 @@ class SQLiteBase(Model):
     @staticmethod
     def register(cls):
         cls.create_table(True)
+        add_missing_columns(cls)
         if hasattr(cls, 'SQL'):
             sqlite_db.execute_sql(cls.SQL)
 
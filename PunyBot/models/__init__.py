@@ -1,3 +1,6 @@
 from PunyBot.models.agreement import Agreement
 from PunyBot.models.pickupgames import PickupGame
-from PunyBot.models.media_cache import SteamNewsCache, RssCache
+from PunyBot.models.media_cache import SteamNewsCache, SteamAppCache, RssCache, RssSeenItem
+from PunyBot.models.outbox import OutboxMessage, OutboxStatus
+from PunyBot.models.source_health import SourceHealth
+from PunyBot.models.command_sync import CommandSyncState
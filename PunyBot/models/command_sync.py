@@ -0,0 +1,17 @@
+from datetime import datetime
+
+from peewee import TextField, DateTimeField
+
+from PunyBot.database import SQLiteBase
+
+
+@SQLiteBase.register
+class CommandSyncState(SQLiteBase):
+    class Meta:
+        table_name = 'command_sync_state'
+
+    # "global:APPLICATION_ID" or "guild:APPLICATION_ID:GUILD_ID"
+    scope = TextField(primary_key=True)
+    # Hash of the commands last written to this scope, see PunyBot.utils.commands
+    hash = TextField()
+    synced_at = DateTimeField(default=datetime.now)
@@ -1,4 +1,6 @@
-from peewee import TextField, BigIntegerField, CompositeKey, IntegerField
+from datetime import datetime
+
+from peewee import TextField, BigIntegerField, CompositeKey, IntegerField, DateTimeField
 
 from PunyBot.database import SQLiteBase
 
@@ -10,6 +12,24 @@ class RssCache(SQLiteBase):
 
     url = TextField(primary_key=True)
     latest_post = TextField(null=False)
+    # Validators from the last full response, sent back as a conditional GET.
+    etag = TextField(null=True)
+    last_modified = TextField(null=True)
+
+
+@SQLiteBase.register
+class RssSeenItem(SQLiteBase):
+    class Meta:
+        table_name = 'rss_seen_items'
+        primary_key = CompositeKey('url', 'guid')
+        indexes = (
+            (('seen_at',), False),
+        )
+
+    url = TextField()
+    # The entry's GUID, or its link if the feed doesn't provide one.
+    guid = TextField()
+    seen_at = DateTimeField(default=datetime.now)
 
 
 @SQLiteBase.register
@@ -19,3 +39,17 @@ class SteamNewsCache(SQLiteBase):
 
     app = IntegerField(primary_key=True)
     post_id = BigIntegerField(null=False)
+    # Unix timestamp of the cached post, used to find every newer item.
+    post_date = IntegerField(null=True)
+
+
+@SQLiteBase.register
+class SteamAppCache(SQLiteBase):
+    class Meta:
+        table_name = 'steam_app_cache'
+
+    app = IntegerField(primary_key=True)
+    # Both stay empty for apps the store doesn't know (or won't show).
+    name = TextField(null=True)
+    header_image = TextField(null=True)
+    updated_at = DateTimeField(default=datetime.now)
@@ -0,0 +1,32 @@
+from datetime import datetime
+
+from peewee import IntegerField, DateTimeField, TextField
+from playhouse.sqlite_ext import JSONField
+
+from PunyBot.database import SQLiteBase
+
+
+class OutboxStatus:
+    PENDING = 1
+    DELIVERED = 2
+    FAILED = 3
+
+
+@SQLiteBase.register
+class OutboxMessage(SQLiteBase):
+    class Meta:
+        table_name = 'outbox_messages'
+        indexes = (
+            (('status', 'next_attempt'), False),
+        )
+
+    id = IntegerField(primary_key=True)
+    # "webhook:ID/TOKEN" or "channel:ID"
+    route = TextField()
+    payload = JSONField()
+    created_at = DateTimeField(default=datetime.now)
+    attempts = IntegerField(default=0)
+    next_attempt = DateTimeField(default=datetime.now)
+    status = IntegerField(default=OutboxStatus.PENDING)
+    delivered_at = DateTimeField(null=True)
+    last_error = TextField(null=True)
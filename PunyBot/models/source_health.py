@@ -0,0 +1,22 @@
+from peewee import TextField, IntegerField, DateTimeField, FloatField
+
+from PunyBot.database import SQLiteBase
+
+
+@SQLiteBase.register
+class SourceHealth(SQLiteBase):
+    class Meta:
+        table_name = 'source_health'
+
+    # "steam:APP_ID" or "rss:FEED_URL"
+    source = TextField(primary_key=True)
+    last_success = DateTimeField(null=True)
+    last_failure = DateTimeField(null=True)
+    last_error = TextField(null=True)
+    consecutive_failures = IntegerField(default=0)
+    # Circuit breaker state, see PunyBot.utils.circuit
+    trips = IntegerField(default=0)
+    open_until = DateTimeField(null=True)
+    # Moving averages over successful requests.
+    avg_latency = FloatField(default=0)
+    avg_bytes = FloatField(default=0)
@@ -5,65 +5,59 @@ from disco.types.message import MessageModal, ActionRow, TextInputStyles, Compon
 from PunyBot import CONFIG
 from PunyBot.constants import Messages
 from PunyBot.models import Agreement
+from PunyBot.utils.interactions import interactions, route
+from PunyBot.utils.perf import TimedPlugin
 
 
-class AgreementPlugin(Plugin):
+class AgreementPlugin(TimedPlugin):
     def load(self, ctx):
-        super(AgreementPlugin, self).load(ctx)
-
-    @Plugin.listen('InteractionCreate')
-    def button_listener(self, event):
-
-        #Todo: Switch back to event.type after lib patch.
-        if not (event.raw_data['interaction']['type'] != 3 or event.raw_data['interaction']['type'] != 5):
-            return
+        interactions.register(self)
 
-        if event.raw_data['interaction']['type'] != InteractionType.MODAL_SUBMIT:
-            if event.data.custom_id != "agreement_start":
-                return
+        super(AgreementPlugin, self).load(ctx)
 
-            if CONFIG.agreement.post_process_role in event.member.roles:
-                return event.reply(type=6)
+    @route(InteractionType.MESSAGE_COMPONENT, "agreement_start")
+    def agreement_start(self, event):
+        if CONFIG.agreement.post_process_role in event.member.roles:
+            return event.reply(type=6)
 
-            username = MessageComponent()
-            username.type = ComponentTypes.TEXT_INPUT
-            username.style = TextInputStyles.SHORT
-            username.label = "Do you swear by the Creed? Sign Thy Name."
-            username.placeholder = event.member.user.username
-            username.required = True
-            username.custom_id = "username"
+        username = MessageComponent()
+        username.type = ComponentTypes.TEXT_INPUT
+        username.style = TextInputStyles.SHORT
+        username.label = "Do you swear by the Creed? Sign Thy Name."
+        username.placeholder = event.member.user.username
+        username.required = True
+        username.custom_id = "username"
 
-            ar1 = ActionRow()
-            ar1.add_component(username)
+        ar1 = ActionRow()
+        ar1.add_component(username)
 
-            modal = MessageModal()
-            modal.title = "Survivor's Creed"
-            modal.custom_id = "agreement_submit"
-            modal.add_component(ar1)
+        modal = MessageModal()
+        modal.title = "Survivor's Creed"
+        modal.custom_id = "agreement_submit"
+        modal.add_component(ar1)
 
-            return event.reply(type=9, modal=modal)
-        else:
-            if event.data.custom_id != "agreement_submit":
-                return
+        return event.reply(type=9, modal=modal)
 
-            username = None
+    @route(InteractionType.MODAL_SUBMIT, "agreement_submit")
+    def agreement_submit(self, event):
+        username = None
 
-            for action_row in event.data.components:
-                for component in action_row.components:
-                    if component.custom_id == "username":
-                        username = component.value
-                        break
+        for action_row in event.data.components:
+            for component in action_row.components:
+                if component.custom_id == "username":
+                    username = component.value
+                    break
 
-            if username != event.member.user.username:
-                return event.reply(type=4, content=Messages.creed_agreement_failed, flags=(1 << 6))
+        if username != event.member.user.username:
+            return event.reply(type=4, content=Messages.creed_agreement_failed, flags=(1 << 6))
 
-            try:
-                event.guild.get_member(event.member.id).add_role(CONFIG.agreement.post_process_role, reason="Survivor's Creed signed! Assigned proper role!")
-            except:
-                self.log.error(f"Unable to add role to user who signed the Survivor's Creed. User ID {event.member.id}")
-            Agreement.create(user_id=event.member.id, creed_agree=username)
+        try:
+            event.guild.get_member(event.member.id).add_role(CONFIG.agreement.post_process_role, reason="Survivor's Creed signed! Assigned proper role!")
+        except:
+            self.log.error(f"Unable to add role to user who signed the Survivor's Creed. User ID {event.member.id}")
+        Agreement.create(user_id=event.member.id, creed_agree=username)
 
-            return event.reply(type=6)
+        return event.reply(type=6)
 
     @Plugin.command("sendagreementmsg")
     def send_agreement_msg(self, event):
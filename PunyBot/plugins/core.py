@@ -1,10 +1,9 @@
 import contextlib
 import os
-import random
+import time
 from datetime import datetime
 
 import gevent
-import requests
 import yaml
 from disco.api.http import APIException
 from disco.bot import Plugin
@@ -16,99 +15,165 @@ from disco.types.message import ActionRow, MessageComponent, ComponentTypes, Sel
 from disco.types.permissions import Permissions
 from disco.types.user import Status, Activity, ActivityTypes
 from dotenv import load_dotenv
+from gevent.pool import Pool
 
 from PunyBot import CONFIG
 from PunyBot.constants import Messages
-
-
-class CorePlugin(Plugin):
+from PunyBot.utils.attachments import AttachmentTransfer, AttachmentError, upload_limit
+from PunyBot.utils.circuit import CircuitBreaker, CircuitState
+from PunyBot.utils.commands import CommandSync
+from PunyBot.utils.controllog import ControlLog
+from PunyBot.utils.deletion import DeletionBatcher
+from PunyBot.utils.http import http
+from PunyBot.utils.interactions import interactions, route
+from PunyBot.utils.perf import TimedPlugin, perf
+from PunyBot.utils.recent import recent_messages
+from PunyBot.utils.roles import RoleAssigner
+from PunyBot.utils.steam import steam_apps
+
+# Prefix of the admin commands sent as regular messages.
+COMMAND_PREFIX = "!"
+# How often the bot's presence moves on to the next status app.
+STATUS_INTERVAL = 5
+# How often the player counts of all status apps are refreshed in the background.
+PLAYER_COUNT_TTL = 30
+# Counts that couldn't be refreshed for this long are no longer shown.
+PLAYER_COUNT_MAX_AGE = 300
+# How many status apps are requested at the same time.
+PLAYER_COUNT_CONCURRENCY = 8
+# (connect, read) timeouts for a single player count request.
+PLAYER_COUNT_TIMEOUT = (5, 10)
+# Refreshes where every request failed before requests to Steam are paused, and the bounds of that pause.
+STATUS_FAILURE_THRESHOLD = 3
+STATUS_BASE_BACKOFF = 60
+STATUS_MAX_BACKOFF = 1800
+# A half-open refresh that hasn't reported back after this long is given up on, and the next refresh probes again.
+STATUS_PROBE_TIMEOUT = 120
+# How often the slowest listeners, commands and schedules are posted to the logging channel, and how many.
+PERF_REPORT_INTERVAL = 3600
+PERF_REPORT_HANDLERS = 15
+# How often config/message_templates.yaml is checked for changes.
+TEMPLATE_RELOAD_INTERVAL = 10
+
+
+class CorePlugin(TimedPlugin):
     def load(self, ctx):
         load_dotenv()
 
         self.guild_menu_roles = {}
 
+        # Checked for every message the bot sees, so kept as sets instead of searching the config lists.
+        self.admin_roles = frozenset(CONFIG.admin_role)
+        self.auto_delete_channels = frozenset(CONFIG.auto_delete_channels)
+
         self.current_status_app = None
-        self.bad_requests = 0
-        self.schedule_restarts = 0
 
-        # Player/Name Cache
-        self.game_titles = {}
+        # Player Cache, app names come from the shared steam_apps cache.
         self.player_counts = {}
+        # Pauses the player count refresh while Steam is down, instead of hammering it every refresh.
+        self.status_breaker = CircuitBreaker(STATUS_FAILURE_THRESHOLD, STATUS_BASE_BACKOFF, STATUS_MAX_BACKOFF,
+                                             probe_timeout=STATUS_PROBE_TIMEOUT)
+        self.status_last_error = None
+        self.status_last_success = None
+        steam_apps.track(CONFIG.status_apps)
+        self.spawn(steam_apps.run, self.log)
 
         for gid in CONFIG.roles:
-            self.guild_menu_roles[gid] = []
-            for role in CONFIG.roles[gid].select_menu:
-                self.guild_menu_roles[gid].append(role.role_id)
+            self.guild_menu_roles[gid] = frozenset(role.role_id for role in CONFIG.roles[gid].select_menu)
+        self.role_assigner = RoleAssigner(self.client, self.log)
+        self.deletions = DeletionBatcher(self.client, self.log)
+        self.control_log = ControlLog(self.client, self.log, CONFIG.logging_channel)
+        self.register_schedule(self.post_perf_report, PERF_REPORT_INTERVAL, init=False)
+        self.register_schedule(self.reload_message_templates, TEMPLATE_RELOAD_INTERVAL, init=False)
+
+        interactions.register(self)
+        # Answered by the wait_for_event calls of the echo commands.
+        interactions.expect(self, InteractionType.MESSAGE_COMPONENT, "echo_confirm")
+        interactions.expect(self, InteractionType.MESSAGE_COMPONENT, "echo_channel_select")
+        interactions.expect(self, InteractionType.MODAL_SUBMIT, "echo_thread_name")
 
         super(CorePlugin, self).load(ctx)
 
-    # Method to handle any bad steam requests from status updates
-    def handle_bad_requests(self):
-        self.bad_requests += 1
-        if self.bad_requests > 10:
-            self.schedule_restarts += 1
-            if self.schedule_restarts > 3:
-                # Reset values back to 0.
-                self.bad_requests = 0
-                self.schedule_restarts = 0
-
-                # Log and kill the scheduled task
-                self.log.error("Error: More than 3 restarts on the Status Scheduler. Killing until reboot or forced to restart via command.")
-                self.schedules['update_status'].kill()
-                return
-
-            # Log, grab tasks, sleep, re-register, kill old one, reset counter.
-            self.log.error("Error: More than 10 bad steam reponses. Killing status scheduler, pausing for 15 seconds, and retrying.")
-            schedule = self.schedules['update_status']
-            gevent.sleep(10)
-            self.register_schedule(self.update_status, 5, init=False)
-            self.bad_requests = 0
-            schedule.kill()
-        return
+    def fetch_player_count(self, steam_key, app_id):
+        """
+        :return: None if the count was updated, otherwise what went wrong.
+        """
+        try:
+            r = http.get("https://partner.steam-api.com/ISteamUserStats/GetNumberOfCurrentPlayers/v1/",
+                         params={'key': steam_key, 'appid': app_id}, timeout=PLAYER_COUNT_TIMEOUT)
+            if r.status_code == 403:
+                self.log.error(f"Error: 403 Forbidden Given when trying to get player count for APP ID: {app_id}. Are you using a valid API Key?")
+                return "403 Forbidden, invalid API key?"
+            response = r.json().get('response', {})
+            if 'player_count' not in response:
+                self.log.error(f"Error: Unable to grab player information for APP ID: {app_id}")
+                return f"No player count in response (HTTP {r.status_code})"
+        except Exception as e:
+            self.log.error(f"Error: Exception when getting players for APP ID {app_id} from Steam's API. Possible bad response?")
+            return str(e) or e.__class__.__name__
+
+        self.player_counts[app_id] = {'count': response['player_count'], 'last_requested': datetime.now().timestamp()}
+        return None
+
+    def refresh_player_counts(self):
+        # Every status app is refreshed at once in the background, so the presence rotation only reads from memory.
+        if not self.status_breaker.allow():
+            return
 
-    def update_status(self):
+        recovering = self.status_breaker.state == CircuitState.HALF_OPEN
         steam_key = os.getenv("STEAM_API_KEY")
-        players = 0
-        if not self.player_counts.get(self.current_status_app) or (datetime.now().timestamp() - self.player_counts[self.current_status_app]['last_requested']) > 30:
-            try:
-                r = requests.get(
-                    f"https://partner.steam-api.com/ISteamUserStats/GetNumberOfCurrentPlayers/v1/?key={steam_key}&appid={self.current_status_app}")
-                if r.status_code == 403:
-                    self.log.error(f"Error: 403 Forbidden Given when trying to get player count for APP ID: {self.current_status_app}. Are you using a valid API Key?")
-                elif not r.json():
-                    self.log.error("Error: Unable to grab player information")
-                elif r.json()['response'].get('player_count'):
-                    players = r.json()['response']['player_count']
-                    self.player_counts[self.current_status_app] = {'count': players, 'last_requested': datetime.now().timestamp()}
-            except Exception as e:
-                self.log.error("Error: Exception when getting players from Steam's API. Possible bad response? Skipping Status Update...")
-                self.handle_bad_requests()
-                return
-        else:
-            players = self.player_counts[self.current_status_app]['count']
 
-        app_name = None
-        if self.game_titles.get(self.current_status_app):
-            app_name = self.game_titles.get(self.current_status_app)
-        else:
-            try:
-                r = requests.get(f"https://store.steampowered.com/api/appdetails?appids={self.current_status_app}")
-                if not r.json():
-                    self.log.error("Error: Unable to grab store app page")
-                else:
-                    if not r.json()[str(self.current_status_app)]['success']:
-                        self.log.error("Error: App not found on the steam store")
-                    else:
-                        app_name = r.json()[str(self.current_status_app)]['data']['name']
-                        self.game_titles[self.current_status_app] = app_name
-            except Exception as e:
-                self.log.error("Error: Exception when getting app information from Steam's API. Possible bad response? Skipping Status Update...")
-                self.handle_bad_requests()
-                return
+        pool = Pool(PLAYER_COUNT_CONCURRENCY)
+        fetches = [pool.spawn(self.fetch_player_count, steam_key, app_id) for app_id in set(CONFIG.status_apps)]
+        pool.join()
+
+        errors = [job.value for job in fetches if job.value]
+        if len(errors) < len(fetches):
+            self.status_breaker.record_success()
+            self.status_last_success = datetime.now()
+            if recovering:
+                self.log.info("Steam player counts are back, resuming status updates.")
+            return
+
+        # Only a refresh where every app failed counts, a single broken app shouldn't pause the others.
+        self.status_last_error = errors[0]
+        if self.status_breaker.record_failure():
+            self.log.error(f"Error: Player counts failed {self.status_breaker.failures} time(s) in a row. "
+                           f"Pausing requests to Steam for {int(self.status_breaker.retry_in())} seconds.")
+
+    def start_status_schedules(self):
+        # Ready fires again on every reconnect, so schedules from earlier runs are replaced rather than stacked.
+        for schedule in ('refresh_player_counts', 'update_status'):
+            if self.schedules.get(schedule):
+                self.schedules[schedule].kill()
+        # A probe killed along with the old refresh never reports back, the new refresh probes again instead.
+        self.status_breaker.cancel_probe()
+
+        self.register_schedule(self.refresh_player_counts, PLAYER_COUNT_TTL)
+        # The first rotation waits a tick, so the initial refresh has had time to fill the counts.
+        self.register_schedule(self.update_status, STATUS_INTERVAL, init=False)
+
+    def update_status(self):
+        player_count = self.player_counts.get(self.current_status_app)
+
+        # Nothing (recent) to show for this app yet, move on to the next one. Same for apps without a known name.
+        if not player_count or (datetime.now().timestamp() - player_count['last_requested']) > PLAYER_COUNT_MAX_AGE:
+            self.next_status_app()
+            return
+
+        players = player_count['count']
+
+        app_name = steam_apps.name(self.current_status_app)
+        if not app_name:
+            self.next_status_app()
+            return
 
         self.bot.client.update_presence(Status.ONLINE,
                                         Activity(name=f"{players} {app_name} player{'s' if players != 1 else ''}", type=ActivityTypes.WATCHING))
 
+        self.next_status_app()
+
+    def next_status_app(self):
         if CONFIG.status_apps.index(self.current_status_app) == (len(CONFIG.status_apps) - 1):
             self.current_status_app = CONFIG.status_apps[0]
         else:
@@ -116,15 +181,19 @@ class CorePlugin(Plugin):
 
     @contextlib.contextmanager
     def send_control_message(self):
+        """
+        Builds an embed for the logging channel. It's queued and posted in the background, so this never waits on
+        Discord.
+        """
         embed = MessageEmbed()
         embed.set_footer(text='PunyBot Log')
         embed.timestamp = datetime.utcnow().isoformat()
         embed.color = 0x779ecb
         try:
             yield embed
-            self.bot.client.api.channels_messages_create(CONFIG.logging_channel, embeds=[embed])
+            self.control_log.queue(embed)
         except APIException:
-            return self.log.exception('Failed to send control message:')
+            self.log.exception('Failed to send control message:')
 
     @Plugin.listen('Ready')
     def on_ready(self, event):
@@ -155,13 +224,13 @@ class CorePlugin(Plugin):
             if not steam_key:
                  self.log.error("Error: No valid steam api key found. Please add the following environment variable 'STEAM_API_KEY' to your docker config/.env with the value being a publisher API key.")
             else:
-                r = requests.get(f"https://partner.steam-api.com/ISteamApps/GetPartnerAppListForWebAPIKey/v1?key={steam_key}")
+                r = http.get("https://partner.steam-api.com/ISteamApps/GetPartnerAppListForWebAPIKey/v1", params={'key': steam_key})
                 if r.status_code == 403:
                     self.log.error("Error: Invalid Publisher Steam API Key. Can't get player counts!")
                 else:
                     from random import choice
                     self.current_status_app = choice(CONFIG.status_apps)
-                    self.register_schedule(self.update_status, 5)
+                    self.start_status_schedules()
         else:
             self.log.info("Status apps is empty, skipping setting bot status.")
 
@@ -177,10 +246,10 @@ class CorePlugin(Plugin):
                     command["type"] = getattr(ApplicationCommandTypes, global_type.upper())
                     to_register.append(command)
 
-        self.log.info(f"Attempting to register {len(to_register)} commands...")
-
-        updated_commands = self.client.api.applications_global_commands_bulk_overwrite(to_register)
-        self.log.info(f"Successfully Registered {len(updated_commands)} commands!")
+        # Only written when interactions.yaml changed since the last sync, not on every (re)connect.
+        updated_commands = CommandSync(self.client, self.log).sync_global(to_register)
+        if updated_commands is not None:
+            self.log.info(f"Successfully Registered {len(updated_commands)} commands!")
 
 
     # @Plugin.listen('Resumed')
@@ -191,25 +260,51 @@ class CorePlugin(Plugin):
     #         embed.add_field(name='Replayed Events', value=str(self.bot.client.gw.replayed_events))
 
     @Plugin.listen('MessageCreate')
+    def on_message_create(self, event):
+        """
+        The only MessageCreate listener, deciding on auto deletion and commands in one pass. Nearly every message is
+        neither, so both are ruled out with set lookups and a prefix check before any other work.
+        """
+        message = event.message
+
+        if message.guild_id:
+            recent_messages.add(message)
+
+        if message.channel_id in self.auto_delete_channels and event.member and \
+                CONFIG.agreement.post_process_role not in event.member.roles and \
+                message.author.id != self.client.state.me.id:
+            self.deletions.queue(message.channel_id, message.id)
+
+        if not message.content or not message.content.startswith(COMMAND_PREFIX):
+            return
+
+        self.on_command_msg(event)
+
+    @Plugin.listen('MessageUpdate')
+    def on_message_update(self, event):
+        recent_messages.update(event.message)
+
+    @Plugin.listen('MessageDelete')
+    def on_message_delete(self, event):
+        recent_messages.delete(event.channel_id, [event.id])
+
+    @Plugin.listen('MessageDeleteBulk')
+    def on_message_delete_bulk(self, event):
+        recent_messages.delete(event.channel_id, event.ids)
+
     def on_command_msg(self, event):
         """
         Borrow by Nadie <iam@nadie.dev> (https://github.com/hackerjef/) [Used with permission]
         """
         if event.message.author.bot:
             return
-        if not event.guild:
+        if not event.guild or not event.member:
             return
 
-        has_permission = False
-        for role_id in CONFIG.admin_role:
-            if role_id in event.member.roles:
-                has_permission = True
-                break
-
-        if not has_permission:
+        if self.admin_roles.isdisjoint(event.member.roles):
             return
 
-        commands = self.bot.get_commands_for_message(False, {}, '!', event.message)
+        commands = self.bot.get_commands_for_message(False, {}, COMMAND_PREFIX, event.message)
         if not commands:
             return
         for command, match in commands:
@@ -269,14 +364,74 @@ class CorePlugin(Plugin):
     # TODO: Replace with /command
     @Plugin.command('forcestatus')
     def force_status(self, event):
-        if self.schedules.get('update_status'):
-            self.log.info("'forcestatus' command ran and active schedule found... killing schedule...")
-            self.schedules['update_status'].kill()
+        if not self.current_status_app:
+            return event.msg.reply("Status updates aren't running, check the status apps and Steam API key.")
 
-        self.log.info("'forcestatus' command ran. Restarting schedule...")
-        self.register_schedule(self.update_status, 5)
+        # Forcing also closes the breaker, so Steam is asked again right away.
+        self.log.info("'forcestatus' command ran. Resetting the status circuit breaker and restarting schedules...")
+        self.status_breaker.record_success()
+        self.start_status_schedules()
         return event.msg.add_reaction("👍")
 
+    @Plugin.command('statushealth')
+    def status_health(self, event):
+        breaker = self.status_breaker
+        state = breaker.state
+        if breaker.retry_in():
+            state += f", retrying in {int(breaker.retry_in())}s"
+
+        fresh = len([app_id for app_id in set(CONFIG.status_apps) if self.player_counts.get(app_id) and
+                     datetime.now().timestamp() - self.player_counts[app_id]['last_requested'] <= PLAYER_COUNT_MAX_AGE])
+        last_success = self.status_last_success.strftime('%Y-%m-%d %H:%M:%S') if self.status_last_success else "never"
+
+        return event.msg.reply(f"```Circuit: {state}\n"
+                               f"Failed refreshes in a row: {breaker.failures} (opened {breaker.trips} time(s) in a row)\n"
+                               f"Apps with a current player count: {fresh}/{len(set(CONFIG.status_apps))}\n"
+                               f"Last successful refresh: {last_success}\n"
+                               f"Last error: {self.status_last_error or 'none'}```")
+
+    def reload_message_templates(self):
+        # Edits to the templates go live without a restart, a broken edit keeps the previous templates.
+        Messages.reload(self.log)
+
+    def post_perf_report(self):
+        if not perf.histograms:
+            return
+
+        report = "\n".join(perf.report(PERF_REPORT_HANDLERS))
+        with self.send_control_message() as embed:
+            embed.title = 'Handler Latency'
+            embed.description = f"```{report[:4000]}```"
+
+    @Plugin.command('perf', '[count:int]')
+    def perf_stats(self, event, count=15):
+        if not perf.histograms:
+            return event.msg.reply("Nothing has been timed yet.")
+
+        uptime = int(time.time() - perf.started)
+        content = "\n".join(perf.report(count))
+        if len(content) > 1900:
+            content = content[:1897] + "..."
+        return event.msg.reply(f"Slowest handlers by p99 over the last {uptime // 3600}h {uptime % 3600 // 60}m:\n"
+                               f"```{content}```")
+
+    @Plugin.command('httpstats')
+    def http_stats(self, event):
+        if not http.metrics:
+            return event.msg.reply("No outbound requests made yet.")
+
+        lines = []
+        for host, metrics in sorted(http.metrics.items(), key=lambda item: item[1].requests, reverse=True):
+            lines.append(f"{host}: {metrics.requests} request(s), {metrics.errors} error(s), "
+                         f"avg {metrics.average_latency * 1000:.0f}ms, max {metrics.max_latency * 1000:.0f}ms")
+            if metrics.last_error:
+                lines.append(f"  last error: {metrics.last_error}")
+
+        content = "\n".join(lines)
+        if len(content) > 1990:
+            content = content[:1987] + "..."
+        return event.msg.reply(f"```{content}```")
+
     @Plugin.command('echo', '<msg:snowflake> [channel:snowflake|channel] [topic:str...]')
     def echo_command(self, event, msg, channel=None, topic=None):
         api_message = None
@@ -308,29 +463,24 @@ class CorePlugin(Plugin):
             return event.msg.reply("`Error`: **UNKNOWN ERROR...**")
 
         content = api_message.content
-        attachments = []
-
-        if api_message.attachments:
-            for attachment in api_message.attachments:
-                tmp = api_message.attachments[attachment]
-                r = requests.get(tmp.url)
-                r.raise_for_status()
-                attachments.append((tmp.filename, r.content))
 
         # TODO: Split into multiple messages
         if len(content) > 2000:
             event.msg.add_reaction("👎")
             return event.msg.reply(f"`Error`: **Your original message is over 2000 characters** (`{len(content) - 2000} Over, {len(content)} Total`)")
 
+        if channel_to_send_to.type in [ChannelType.GUILD_FORUM, ChannelType.GUILD_MEDIA] and not topic:
+            event.msg.reply("`Error:` **Topic not set, please use** `!echo <msgID> <ChannelID> <Thread_Topic>`")
+            return event.msg.add_reaction("👎")
+
         try:
-            if channel_to_send_to.type == 15:
-                if not topic:
-                    event.msg.reply("`Error:` **Topic not set, please use** `!echo <msgID> <ChannelID> <Thread_Topic>`")
-                    return event.msg.add_reaction("👎")
-                msg = {'content': content, 'attachments': attachments}
-                channel_to_send_to.start_forum_thread(content=content, name=topic, attachments=attachments,allowed_mentions={'parse': ["roles", "users", "everyone"]})
-            else:
-                channel_to_send_to.send_message(content or None, attachments=attachments,allowed_mentions={'parse': ["roles", "users", "everyone"]})
+            with AttachmentTransfer(api_message.attachments.values(), upload_limit(channel_to_send_to.guild)) as transfer:
+                transfer.download()
+                transfer.send(channel_to_send_to, content or None, thread_name=topic,
+                              allowed_mentions={'parse': ["roles", "users", "everyone"]})
+        except AttachmentError as e:
+            event.msg.add_reaction("👎")
+            return event.msg.reply(f"`Error`: **{e}**")
         except APIException as e:
             if e.code in [50013, 50001]:
                 event.msg.add_reaction("👎")
@@ -340,46 +490,125 @@ class CorePlugin(Plugin):
                 raise e
         return event.msg.add_reaction("👍")
 
-    @Plugin.listen('InteractionCreate')
-    def test_menu_select(self, event):
+    @Plugin.command('echomany', '<msg:snowflake> <targets:str...>')
+    def echo_many_command(self, event, msg, targets):
+        """
+        Echoes one message into several channels at once, e.g. `!echomany <msg_id> #news #updates <forum_id> | Title`.
+        The message and its attachments are only downloaded once.
+        """
+        targets, _, topic = targets.partition("|")
+        topic = topic.strip() or None
+        if not targets.split():
+            event.msg.add_reaction("👎")
+            return event.msg.reply("`Error`: **No channels given.** Usage: `!echomany <msg_id> <channels...> [| topic]`")
 
-        # TODO: Fix after Disco fixes their enum bug.
-        if event.raw_data['interaction']['type'] != 3:
-            return
+        try:
+            api_message = self.client.api.channels_messages_get(event.channel.id, msg)
+        except APIException as e:
+            if e.code == 10008:
+                return event.msg.reply(
+                    "`Error`: **Message not found...Please make sure you are running this command in the "
+                    "same channel as your original message!**")
+            raise e
 
-        if event.data.custom_id.startswith('roles_menu_'):
-            tmp_roles = event.member.roles
-            for role_id in self.guild_menu_roles[event.guild.id]:
-                if role_id in event.data.values:
-                    continue
-                if role_id in tmp_roles:
-                    tmp_roles.remove(role_id)
-            for selection in event.data.values:
-                if selection not in tmp_roles:
-                    tmp_roles.append(selection)
+        content = api_message.content
+        if len(content) > 2000:
+            event.msg.add_reaction("👎")
+            return event.msg.reply(f"`Error`: **Your original message is over 2000 characters** (`{len(content) - 2000} Over, {len(content)} Total`)")
+
+        channels = []
+        results = []
+        for target in dict.fromkeys(targets.split()):
+            channel = None
+            if target.strip("<#>").isdigit():
+                channel_id = int(target.strip("<#>"))
+                channel = self.client.state.channels.get(channel_id) or self.client.state.threads.get(channel_id)
+
+            if not channel or channel.guild_id != event.guild.id:
+                results.append(f"❌ `{target}`: Unknown channel")
+            elif problem := self.echo_problem(channel, topic, bool(api_message.attachments)):
+                results.append(f"❌ <#{channel.id}>: {problem}")
+            else:
+                channels.append(channel)
+
+        if channels:
+            try:
+                with AttachmentTransfer(api_message.attachments.values(), upload_limit(event.guild)) as transfer:
+                    transfer.download()
+                    published = transfer.publish(channels, content or None, thread_name=topic,
+                                                 allowed_mentions={'parse': ["roles", "users", "everyone"]})
+            except AttachmentError as e:
+                event.msg.add_reaction("👎")
+                return event.msg.reply(f"`Error`: **{e}**")
 
-            event.guild.get_member(event.member.id).modify(roles=tmp_roles, reason="Updating selected roles from menu")
-            # event.m.modify(roles=tmp_roles, reason="Updating selected roles from menu")
+            for channel, sent, error in published:
+                if error is None:
+                    results.append(f"✅ <#{channel.id}>: https://discord.com/channels/{event.guild.id}/{channel.id}/{sent.id}")
+                elif isinstance(error, APIException) and error.code in [50013, 50001]:
+                    results.append(f"❌ <#{channel.id}>: Missing permission to echo")
+                else:
+                    results.append(f"❌ <#{channel.id}>: {str(error) or error.__class__.__name__}")
 
-            return event.reply(type=6)
+        sent_count = len([line for line in results if line.startswith("✅")])
+        event.msg.add_reaction("👍" if sent_count == len(results) else "👎")
 
-        if event.data.custom_id.startswith('rules_'):
-            if CONFIG.roles[event.guild.id].rules_accepted not in event.member.roles:
-                # event.m.add_role(self.guild_rules_roles.get(event.guild.id), reason="Accepted Rules")
-                event.guild.get_member(event.member.id).add_role(CONFIG.roles[event.guild.id].rules_accepted,
-                                                            reason="Accepted Rules")
+        summary = "\n".join([f"**Echoed to {sent_count}/{len(results)} channel(s)**"] + results)
+        if len(summary) > 2000:
+            summary = summary[:1997] + "..."
+        return event.msg.reply(summary)
 
-            return event.reply(type=6)
+    def echo_problem(self, channel, topic, has_attachments):
+        """
+        :return: Why a message can't be echoed into the channel, or None if it can.
+        """
+        if channel.type in [ChannelType.GUILD_FORUM, ChannelType.GUILD_MEDIA] and not topic:
+            return "Forum channel, add a thread title after `|`"
+
+        # Threads don't have their own overwrites, they use the ones of their parent.
+        if channel.is_thread:
+            parent = self.client.state.channels.get(channel.parent_id)
+            if not parent:
+                return "Unknown parent channel"
+            permissions = parent.get_permissions(self.client.state.me.id)
+            send = Permissions.SEND_MESSAGES_IN_THREADS
+        else:
+            permissions = channel.get_permissions(self.client.state.me.id)
+            send = Permissions.SEND_MESSAGES
 
+        if not permissions.can(send):
+            return "Missing permission to send messages"
+        if has_attachments and not permissions.can(Permissions.ATTACH_FILES):
+            return "Missing permission to attach files"
+        return None
 
-    @Plugin.listen("InteractionCreate", conditional=lambda e: e.type == InteractionType.APPLICATION_COMMAND and e.data.name == "echo")
+    @Plugin.listen('InteractionCreate')
+    def on_interaction(self, event):
+        # The only InteractionCreate listener, every plugin registers its handlers with the shared router instead.
+        return interactions.dispatch(event, self.log)
+
+    @route(InteractionType.MESSAGE_COMPONENT, 'roles_menu_', prefix=True)
+    def roles_menu_select(self, event):
+        # Acknowledged first, the roles are updated once the member stops changing their selection.
+        event.reply(type=6)
+        self.role_assigner.select(event.guild.id, event.member.id, self.guild_menu_roles[event.guild.id],
+                                  [int(role_id) for role_id in event.data.values])
+
+    @route(InteractionType.MESSAGE_COMPONENT, 'rules_', prefix=True)
+    def rules_button(self, event):
+        if CONFIG.roles[event.guild.id].rules_accepted not in event.member.roles:
+            # event.m.add_role(self.guild_rules_roles.get(event.guild.id), reason="Accepted Rules")
+            event.guild.get_member(event.member.id).add_role(CONFIG.roles[event.guild.id].rules_accepted,
+                                                        reason="Accepted Rules")
+
+        return event.reply(type=6)
+
+    @route(InteractionType.APPLICATION_COMMAND, "echo")
     def new_echo_command(self, event):
         # Grab all the data required from the command.
         message_id = None
         channel_id = None
         preview = False
         thread_name = None
-        preview_msg = None
 
         if len(event.data.options) == 2:
             message_id = event.data.options[0].value
@@ -427,19 +656,22 @@ class CorePlugin(Plugin):
             return event.reply(type=4, content="**Error**: `Message not found.`", flags=(1 << 6))
 
         content = message_object.content
-        attachments = []
-
-        if message_object.attachments:
-            for attachment in message_object.attachments:
-                tmp = message_object.attachments[attachment]
-                r = requests.get(tmp.url)
-                r.raise_for_status()
-                attachments.append((tmp.filename, r.content))
 
         # TODO: Split into multiple messages, maybe?
         if len(content) > 2000:
             return event.reply(type=4, content=f"**Error**: `Original message is over 2000 characters. [{len(content) - 2000} Over, {len(content)} Total]`", flags=(1 << 6))
 
+        with AttachmentTransfer(message_object.attachments.values(), upload_limit(channel.guild)) as transfer:
+            try:
+                transfer.download()
+            except AttachmentError as e:
+                return event.reply(type=4, content=f"**Error**: `{e}`", flags=(1 << 6))
+
+            return self.send_echo(event, channel, content, thread_name, preview, transfer)
+
+    def send_echo(self, event, channel, content, thread_name, preview, transfer):
+        preview_msg = None
+
         # Preview if needed.
         if preview:
             buttons = ActionRow()
@@ -456,7 +688,7 @@ class CorePlugin(Plugin):
             content_to_send = f"{header}{content}"
 
             # TODO: Fix broken attachments
-            preview_msg = event.reply(type=4, content=content_to_send, attachments=attachments, components=[buttons.to_dict()], flags=(1 << 6))
+            preview_msg = event.reply(type=4, content=content_to_send, attachments=transfer.files, components=[buttons.to_dict()], flags=(1 << 6))
 
             try:
                 preview_event = self.wait_for_event("InteractionCreate", conditional=lambda e: e.type == InteractionType.MESSAGE_COMPONENT and e.message.id == preview_msg.id).get(timeout=10)
@@ -467,10 +699,8 @@ class CorePlugin(Plugin):
                 return preview_msg.edit(content=content_to_send, components=[buttons.to_dict()])
 
         # Send the message!
-        if channel.type in [ChannelType.GUILD_FORUM, ChannelType.GUILD_MEDIA]:
-            sent = channel.start_forum_thread(content=content or None, name=thread_name, attachments=attachments, allowed_mentions={'parse': ["roles", "users", "everyone"]})
-        else:
-            sent = channel.send_message(content=content or None, attachments=attachments, allowed_mentions={'parse': ["roles", "users", "everyone"]})
+        sent = transfer.send(channel, content or None, thread_name=thread_name,
+                             allowed_mentions={'parse': ["roles", "users", "everyone"]})
 
         msg_link = f"https://discord.com/channels/{event.guild.id}/{channel.id}/{sent.id}"
 
@@ -480,48 +710,15 @@ class CorePlugin(Plugin):
             return event.reply(type=4, content=f"Echo Successful! 👍:\n{msg_link}", flags=(1 << 6))
 
 
-    @Plugin.listen("InteractionCreate", conditional=lambda e: e.type == InteractionType.APPLICATION_COMMAND_AUTOCOMPLETE and e.data.name == "echo")
+    @route(InteractionType.APPLICATION_COMMAND_AUTOCOMPLETE, "echo")
     def new_echo_command_autocomplete(self, event):
-        messages = self.client.api.channels_messages_list(event.channel.id, limit=25)
-
-        choices = []
-        for msg in messages:
-            if len(choices) == 25:
-                break
-            author_name = msg.author.username
-            if not msg.content:
-                if msg.attachments:
-                    names = [msg.attachments[file].filename for file in msg.attachments]
-                    name_str = ", ".join(names)
-                    if len(name_str) > 100:
-                        choices.append({
-                            "name": f"{author_name}: {name_str[:95-len(author_name)]}...",
-                            "value": str(msg.id)
-                        })
-                    else:
-                        choices.append({
-                            "name": f"{author_name}: {name_str}",
-                            "value": str(msg.id)
-                        })
-                else:
-                    choices.append({
-                        "name": f"{author_name}: *NO CONTENT*",
-                        "value": str(msg.id)
-                    })
-            elif len(f"{author_name}: {msg.content}") > 100:
-                choices.append({
-                    "name": f"{author_name}: {msg.content[:95-len(author_name)]}...",
-                    "value": str(msg.id)
-                })
-            else:
-                choices.append({
-                    "name": f"{author_name}: {msg.content}",
-                    "value": str(msg.id)
-                })
+        typed = next((option.value for option in event.data.options if option.focused), "")
+        messages = recent_messages.search(self.client, event.channel.id, self.log, query=str(typed))
 
+        choices = [{"name": msg.label(with_author=True), "value": str(msg.id)} for msg in messages]
         return event.reply(type=8, choices=choices)
 
-    @Plugin.listen("InteractionCreate", conditional=lambda e: e.type == InteractionType.APPLICATION_COMMAND and e.data.name == "Echo Message")
+    @route(InteractionType.APPLICATION_COMMAND, "Echo Message")
     def new_echo_menu_command(self, event):
         # select = MessageComponent(type=ComponentTypes.CHANNEL_SELECT.real, min_values=1, max_values=1, channel_types=[0, 5, 11, 10, 12, 13, 15, 16])
         select = MessageComponent()
@@ -629,40 +826,20 @@ class CorePlugin(Plugin):
             return initial_message.edit(content="**Error**: `Message not found.`")
 
         content = message_object.content
-        attachments = []
-
-        if message_object.attachments:
-            for attachment in message_object.attachments:
-                tmp = message_object.attachments[attachment]
-                r = requests.get(tmp.url)
-                r.raise_for_status()
-                attachments.append((tmp.filename, r.content))
 
         # TODO: Split into multiple messages, maybe?
         if len(content) > 2000:
             return initial_message.edit(content=f"**Error**: `Original message is over 2000 characters. [{len(content) - 2000} Over, {len(content)} Total]`")
 
         # Send the message!
-        if channel.type in [ChannelType.GUILD_FORUM, ChannelType.GUILD_MEDIA]:
-            sent = channel.start_forum_thread(content=content or None, name=thread_name, attachments=attachments,
-                                              allowed_mentions={'parse': ["roles", "users", "everyone"]})
-        else:
-            sent = channel.send_message(content=content or None, attachments=attachments,
-                                        allowed_mentions={'parse': ["roles", "users", "everyone"]})
+        try:
+            with AttachmentTransfer(message_object.attachments.values(), upload_limit(channel.guild)) as transfer:
+                transfer.download()
+                sent = transfer.send(channel, content or None, thread_name=thread_name,
+                                     allowed_mentions={'parse': ["roles", "users", "everyone"]})
+        except AttachmentError as e:
+            return initial_message.edit(content=f"**Error**: `{e}`")
 
         msg_link = f"https://discord.com/channels/{event.guild.id}/{channel.id}/{sent.id}"
 
         return initial_message.edit(content=f"Echo Successful! 👍:\n{msg_link}")
-
-
-    @Plugin.listen("MessageCreate", conditional=lambda e: e.channel.id in CONFIG.auto_delete_channels and CONFIG.agreement.post_process_role not in e.member.roles)
-    def auto_delete_messages(self, event):
-        if event.message.author.id == self.client.state.me.id:
-            return
-        # Attempt to avoid rate limits on channel deletions.
-        delay = random.uniform(0, 1.5)
-        gevent.sleep(delay)
-        try:
-            event.message.delete()
-        except Exception:
-            pass
@@ -9,10 +9,14 @@ from disco.types.message import MessageComponent, ComponentTypes, ButtonStyles,
 from PunyBot import CONFIG
 from PunyBot.constants import Messages
 from PunyBot.models.collaboration import CollaborationRequest
+from PunyBot.utils.interactions import interactions, route
+from PunyBot.utils.perf import TimedPlugin
 
 
-class FormPlugin(Plugin):
+class FormPlugin(TimedPlugin):
     def load(self, ctx):
+        interactions.register(self)
+
         super(FormPlugin, self).load(ctx)
 
     @Plugin.command('sendcollabform')
@@ -31,7 +35,7 @@ class FormPlugin(Plugin):
         # Return the message
         return event.channel.send_message(content=Messages.collab_form_message, components=[components.to_dict()])
 
-    @Plugin.listen("InteractionCreate", conditional=lambda e: e.type == InteractionType.MESSAGE_COMPONENT and e.data.custom_id == "start_collabform")
+    @route(InteractionType.MESSAGE_COMPONENT, "start_collabform")
     def send_collab_form_modal(self, event):
 
         # Get modal format from interactions file
@@ -41,7 +45,7 @@ class FormPlugin(Plugin):
         # Send the modal
         return event.reply(type=9, modal=interaction_components['components']['collab_modal'])
 
-    @Plugin.listen("InteractionCreate", conditional=lambda e: e.type == InteractionType.MODAL_SUBMIT and e.data.custom_id == "collab_form_submit")
+    @route(InteractionType.MODAL_SUBMIT, "collab_form_submit")
     def collab_form_submission(self, event):
         # Get current timestamp for tracking
         current_timestamp = datetime.datetime.now(datetime.timezone.utc)
@@ -3,19 +3,35 @@ from datetime import datetime
 import gevent
 from disco.api.http import APIException
 from disco.bot import Plugin
+from disco.types.application import InteractionType
 from disco.types.message import ActionRow, MessageComponent, ComponentTypes, SelectOption
 
 from PunyBot.models.kaboom import KaboomMessage
+from PunyBot.utils.commands import CommandSync
+from PunyBot.utils.interactions import interactions, route
+from PunyBot.utils.perf import TimedPlugin, perf
+from PunyBot.utils.recent import recent_messages
 from PunyBot.utils.timing import Eventual
 
+# Self destruct timers offered in the kaboom menu, in minutes.
+MIN_TO_STRING = {
+    1: "1 Minute",
+    15: "15 Minutes",
+    60: "1 Hour",
+    1440: "1 Day",
+    4320: "3 Days"
+}
 
-class KaboomPlugin(Plugin):
+
+class KaboomPlugin(TimedPlugin):
     def load(self, ctx):
 
-        self.timed_tasks = Eventual(self.kaboom_messages)
+        self.timed_tasks = Eventual(perf.wrap('schedule', f"{self.name}.kaboom_messages", self.kaboom_messages))
 
         self.spawn_later(5, self.queue_tasks)
 
+        interactions.register(self)
+
         super(KaboomPlugin, self).load(ctx)
 
     def kaboom_messages(self):
@@ -74,9 +90,8 @@ class KaboomPlugin(Plugin):
         else:
             return False
 
-    # TODO: Move all slash commands to a single register event with a "first_run" flag in the database or something.
-    @Plugin.command('setupcmds')
-    def setup_commands_cmd(self, event):
+    @Plugin.command('setupcmds', '[force:str]')
+    def setup_commands_cmd(self, event, force=None):
         message_cmd = {
             "type": 3,
             "name": "💣",
@@ -129,138 +144,78 @@ class KaboomPlugin(Plugin):
 
         event.channel.send_typing()
 
-        cmds = self.client.api.applications_guild_commands_get(event.guild.id)
+        # Other commands in the guild are kept, and nothing is written if these haven't changed since the last run.
+        updated = CommandSync(self.client, self.log).sync_guild(event.guild.id, [slash_cmd, message_cmd],
+                                                                force=force == "force")
+        if updated is None:
+            return event.msg.reply("Commands are already up to date! Use `!setupcmds force` to register them again.")
 
-        new_cmds = []
+        return event.msg.reply("Commands have been updated!")
 
-        for cmd in cmds:
-            if cmd.name == slash_cmd['name'] and cmd.type == 1:
-                new_cmds.append(slash_cmd)
-                continue
-            elif cmd.name == message_cmd['name'] and cmd.type == 3:
-                new_cmds.append(message_cmd)
-                continue
-            new_cmds.append(cmd.to_dict())
+    @route(InteractionType.APPLICATION_COMMAND, "💣")
+    def kaboom_menu_command(self, event):
+        msg = list(event.data.resolved.messages.values())[0]
 
-        # Ensure that these commands are in there if they weren't previously registered!
-        if slash_cmd not in new_cmds:
-            new_cmds.append(slash_cmd)
-        elif message_cmd not in new_cmds:
-            new_cmds.append(message_cmd)
+        if event.member.id != msg.author.id:
+            return event.reply(type=4, content="Unable to blow up. Message is not your own!", flags=(1 << 6))
 
-        try:
-            self.client.api.applications_guild_commands_bulk_overwrite(event.guild.id, new_cmds)
-        except APIException as error:
-            raise error
+        components = ActionRow()
 
-        event.channel.send_typing()
-        return event.msg.reply("Commands have been updated!")
+        select_menu = MessageComponent()
+        select_menu.type = ComponentTypes.STRING_SELECT
+        select_menu.custom_id = f"kaboom_select_{msg.id}"
+        select_menu.placeholder = "Select Timeout.."
 
-    @Plugin.listen('InteractionCreate')
-    def kaboom_cmd(self, event):
+        for key, value in MIN_TO_STRING.items():
+            option = SelectOption()
+            option.label = value
+            option.value = key
+            option.emoji = None
 
-        min_to_string = {
-            1: "1 Minute",
-            15: "15 Minutes",
-            60: "1 Hour",
-            1440: "1 Day",
-            4320: "3 Days"
-        }
+            select_menu.options.append(option)
 
-        if event.raw_data['interaction']['type'] == 2 and event.data.name == "💣":
-            msg = list(event.data.resolved.messages.values())[0]
+        select_menu.max_values = 1
+        select_menu.min_values = 1
 
-            if event.member.id != msg.author.id:
-                return event.reply(type=4, content="Unable to blow up. Message is not your own!", flags=(1 << 6))
+        components.add_component(select_menu)
 
-            components = ActionRow()
+        return event.reply(type=4,
+                           content="Kaboom Activated! Please select the time in which the message will self destruct...",
+                           components=[components.to_dict()], flags=(1 << 6))
 
-            select_menu = MessageComponent()
-            select_menu.type = ComponentTypes.STRING_SELECT
-            select_menu.custom_id = f"kaboom_select_{msg.id}"
-            select_menu.placeholder = "Select Timeout.."
+    @route(InteractionType.MESSAGE_COMPONENT, "kaboom_select_", prefix=True)
+    def kaboom_select(self, event):
+        message_id = int(event.data.custom_id.replace("kaboom_select_", ""))
 
-            for key, value in min_to_string.items():
-                option = SelectOption()
-                option.label = value
-                option.value = key
-                option.emoji = None
+        will_kaboom = self.mark_as_kaboom(message_id, event.channel.id, int(event.data.values[0]))
 
-                select_menu.options.append(option)
-
-            select_menu.max_values = 1
-            select_menu.min_values = 1
+        if will_kaboom:
+            msg_link = f"https://discord.com/channels/{event.guild.id}/{event.channel.id}/{message_id}"
+            self.client.api.channels_messages_reactions_create(event.channel.id, message_id, "💣")
+            return event.reply(type=7,
+                               content=f"[This Message]({msg_link}) will self-destruct in {MIN_TO_STRING[int(event.data.values[0])]}",
+                               flags=(1 << 6))
+        else:
+            return event.reply(type=7, content="This message is already marked to blow up. Unable to blow up.", flags=(1 << 6))
 
-            components.add_component(select_menu)
+    @route(InteractionType.APPLICATION_COMMAND, "kaboom")
+    def kaboom_command(self, event):
+        will_kaboom = self.mark_as_kaboom(int(event.data.options[0].value), event.channel.id, int(event.data.options[1].value))
 
+        if will_kaboom:
+            self.client.api.channels_messages_reactions_create(event.channel.id, event.data.options[0].value, "💣")
+            msg_link = f"https://discord.com/channels/{event.guild.id}/{event.channel.id}/{event.data.options[0].value}"
             return event.reply(type=4,
-                               content="Kaboom Activated! Please select the time in which the message will self destruct...",
-                               components=[components.to_dict()], flags=(1 << 6))
-
-        if event.raw_data['interaction']['type'] == 3 and event.data.custom_id.startswith("kaboom_select"):
-            message_id = int(event.data.custom_id.replace("kaboom_select_", ""))
-
-            will_kaboom = self.mark_as_kaboom(message_id, event.channel.id, int(event.data.values[0]))
-
-            if will_kaboom:
-                msg_link = f"https://discord.com/channels/{event.guild.id}/{event.channel.id}/{message_id}"
-                self.client.api.channels_messages_reactions_create(event.channel.id, message_id, "💣")
-                return event.reply(type=7,
-                                   content=f"[This Message]({msg_link}) will self-destruct in {min_to_string[int(event.data.values[0])]}",
-                                   flags=(1 << 6))
-            else:
-                return event.reply(type=7, content="This message is already marked to blow up. Unable to blow up.", flags=(1 << 6))
-
-        if event.raw_data['interaction']['type'] == 2 and event.data.name == "kaboom":
-
-            will_kaboom = self.mark_as_kaboom(int(event.data.options[0].value), event.channel.id, int(event.data.options[1].value))
-
-            if will_kaboom:
-                self.client.api.channels_messages_reactions_create(event.channel.id, event.data.options[0].value, "💣")
-                msg_link = f"https://discord.com/channels/{event.guild.id}/{event.channel.id}/{event.data.options[0].value}"
-                return event.reply(type=4,
-                                   content=f"[This Message]({msg_link}) will self-destruct in {min_to_string[int(event.data.options[1].value)]}",
-                                   flags=(1 << 6))
-            else:
-                return event.reply(type=4, content="Unable to blow up. Message is already marked for deletion!", flags=(1 << 6))
-
-        if event.raw_data['interaction']['type'] == 4 and event.data.name == "kaboom":
-            messages = self.client.api.channels_messages_list(event.channel.id, limit=25)
-
-            messages = [msg for msg in messages if msg.author.id == event.member.id]
-
-            choices = []
-            for msg in messages:
-                if len(choices) == 25:
-                    break
-                if not msg.content:
-                    if msg.attachments:
-                        names = [msg.attachments[file].filename for file in msg.attachments]
-                        name_str = ", ".join(names)
-                        if len(name_str) > 100:
-                            choices.append({
-                                "name": f"{name_str[:97]}...",
-                                "value": str(msg.id)
-                            })
-                        else:
-                            choices.append({
-                                "name": name_str,
-                                "value": str(msg.id)
-                            })
-                    else:
-                        choices.append({
-                            "name": "*NO CONTENT*",
-                            "value": str(msg.id)
-                        })
-                elif len(msg.content) > 100:
-                    choices.append({
-                        "name": f"{msg.content[:97]}...",
-                        "value": str(msg.id)
-                    })
-                else:
-                    choices.append({
-                        "name": msg.content,
-                        "value": str(msg.id)
-                    })
-
-            return event.reply(type=8, choices=choices)
+                               content=f"[This Message]({msg_link}) will self-destruct in {MIN_TO_STRING[int(event.data.options[1].value)]}",
+                               flags=(1 << 6))
+        else:
+            return event.reply(type=4, content="Unable to blow up. Message is already marked for deletion!", flags=(1 << 6))
+
+    @route(InteractionType.APPLICATION_COMMAND_AUTOCOMPLETE, "kaboom")
+    def kaboom_command_autocomplete(self, event):
+        typed = next((option.value for option in event.data.options if option.focused), "")
+        messages = recent_messages.search(self.client, event.channel.id, self.log, query=str(typed),
+                                          author_id=event.member.id)
+
+        choices = [{"name": msg.label(), "value": str(msg.id)} for msg in messages]
+        return event.reply(type=8, choices=choices)
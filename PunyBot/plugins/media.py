@@ -1,18 +1,55 @@
+import functools
+import json
 import os
-from datetime import datetime
+import sys
+from datetime import datetime, timedelta
 
-import feedparser
-import re
 import gevent
 import requests
 # import tweepy
-import dateutil.parser as parser
 from disco.bot import Plugin
-from urllib.parse import urlparse
+from gevent import subprocess
+from gevent.pool import Pool
 
 from PunyBot import CONFIG
 from PunyBot.constants import Messages
-from PunyBot.models import SteamNewsCache, RssCache
+from PunyBot.database import sqlite_db
+from PunyBot.models import SteamNewsCache, RssCache, RssSeenItem
+from PunyBot.utils.feeds import FeedResult, fetch_feed, newest_entries
+from PunyBot.utils.health import SourceHealthTracker
+from PunyBot.utils.http import http
+from PunyBot.utils.outbox import Outbox
+from PunyBot.utils.perf import TimedPlugin, perf
+from PunyBot.utils.scheduler import AdaptiveScheduler
+from PunyBot.utils.steam import steam_apps
+
+# Starting poll intervals, before the scheduler has learned anything about a source.
+STEAM_POLL_INTERVAL = 60
+RSS_POLL_INTERVAL = 300
+# Longest the scheduler sleeps between checks for due sources.
+SCHEDULER_MAX_SLEEP = 30
+
+# How many Steam apps are requested at the same time.
+STEAM_FETCH_CONCURRENCY = 8
+# (connect, read) timeouts for a single GetNewsForApp request.
+STEAM_FETCH_TIMEOUT = (5, 15)
+# How many of the most recent news items are requested per app.
+STEAM_NEWS_COUNT = 10
+
+# How many feeds are downloaded at the same time.
+RSS_FETCH_CONCURRENCY = 8
+# (connect, read) timeouts for a single feed download.
+RSS_FETCH_TIMEOUT = (5, 20)
+# Upper bound for the whole fetch stage of a single cycle.
+RSS_CYCLE_DEADLINE = 120
+# Articles older than this (in seconds) are never posted.
+RSS_MAX_POST_AGE = 3600
+# Most articles a single feed can post per poll.
+RSS_MAX_ENTRIES = 20
+# How long seen articles are remembered. Must stay well above RSS_MAX_POST_AGE.
+RSS_SEEN_TTL = timedelta(days=7)
+# A half-open source whose probe poll hasn't reported back after this long is probed again, well past a poll's deadline.
+SOURCE_PROBE_TIMEOUT = RSS_CYCLE_DEADLINE * 2
 
 
 # class TwitterStream(tweepy.StreamingClient):
@@ -49,7 +86,7 @@ from PunyBot.models import SteamNewsCache, RssCache
 #             self.bot.plugins['MediaPlugin'].start_twitter_client()
 
 
-class MediaPlugin(Plugin):
+class MediaPlugin(TimedPlugin):
     def load(self, ctx):
 
         if not os.path.exists(os.getcwd() + "/data"):
@@ -61,6 +98,16 @@ class MediaPlugin(Plugin):
         else:
             self.log.info("Twitter API Key not provided, skipping twitter hook.")
 
+        # Posts are queued here by the pollers and delivered by a separate worker.
+        self.outbox = Outbox(self.client, self.log)
+        self.spawn(self.outbox.run)
+
+        self.scheduler = AdaptiveScheduler(CONFIG.media.poll_floor, CONFIG.media.poll_ceiling)
+        # Sources that keep failing are skipped for a growing backoff instead of being hit every poll.
+        self.health = SourceHealthTracker(probe_timeout=SOURCE_PROBE_TIMEOUT)
+        # Sources with a poll in flight, so a slow poll isn't started a second time.
+        self.polling = set()
+
         if len(CONFIG.media.steam) > 0:
             self.steam_news_config = {}
 
@@ -71,7 +118,11 @@ class MediaPlugin(Plugin):
                     else:
                         self.steam_news_config[steam_app].append(CONFIG.media.steam[key].url)
 
-            self.register_schedule(self.get_steam_news, 60)
+            for app_id in self.steam_news_config.keys():
+                self.scheduler.add(('steam', app_id), STEAM_POLL_INTERVAL)
+
+            # App names/header images for the posts, refreshed in the background.
+            steam_apps.track(self.steam_news_config.keys())
 
         else:
             self.log.info("Steam config empty, skipping.")
@@ -86,11 +137,20 @@ class MediaPlugin(Plugin):
                     else:
                         self.rss_config[rss_feed].append(key)
 
-            self.register_schedule(self.check_rss, 300)
+            # In-memory copy of the seen index, {feed_url: {guid: seen_at}}
+            self.rss_seen = {}
+            self.prune_rss_seen()
+            for item in RssSeenItem.select():
+                self.rss_seen.setdefault(item.url, {})[item.guid] = item.seen_at
+
+            for feed_url in self.rss_config.keys():
+                self.scheduler.add(('rss', feed_url), RSS_POLL_INTERVAL)
 
         else:
             self.log.info("RSS News config empty, skipping.")
 
+        self.spawn(self.run_scheduler)
+
         super(MediaPlugin, self).load(ctx)
 
     def unload(self, ctx):
@@ -100,6 +160,89 @@ class MediaPlugin(Plugin):
 
         super(MediaPlugin, self).unload(ctx)
 
+    def run_scheduler(self):
+        while True:
+            try:
+                due = []
+                for key in self.scheduler.due():
+                    # Still being polled from an earlier round, it's looked at again once that poll had time to finish.
+                    if key in self.polling:
+                        self.scheduler.schedule(key, SCHEDULER_MAX_SLEEP)
+                    elif self.source_allowed(key):
+                        due.append(key)
+
+                # Steam and RSS polls run on their own, a slow RSS cycle doesn't hold up Steam apps that are due.
+                self.start_poll(self.get_steam_news, [key for key in due if key[0] == 'steam'])
+                self.start_poll(self.check_rss, [key for key in due if key[0] == 'rss'])
+            except Exception:
+                self.log.exception("[Media] Scheduler iteration failed:")
+
+            wait = self.scheduler.seconds_until_next()
+            gevent.sleep(min(wait, SCHEDULER_MAX_SLEEP) if wait is not None else SCHEDULER_MAX_SLEEP)
+
+    def start_poll(self, poll, keys):
+        if not keys:
+            return
+
+        self.polling.update(keys)
+        greenlet = self.spawn(perf.wrap('schedule', f"{self.name}.{poll.__name__}", poll), [key[1] for key in keys])
+        greenlet.link(functools.partial(self.poll_finished, keys))
+
+    def poll_finished(self, keys, greenlet):
+        self.greenlets.discard(greenlet)
+        self.polling.difference_update(keys)
+
+        # A poll that died part way through still has to go back in the queue.
+        for key in keys:
+            if not self.scheduler.is_scheduled(key):
+                self.scheduler.record(key)
+
+    def source_allowed(self, key):
+        source = f"{key[0]}:{key[1]}"
+        if self.health.allow(source):
+            return True
+
+        # Skipped sources go straight back in the queue, timed to when their breaker lets a probe through.
+        self.scheduler.schedule(key, max(self.health.retry_in(source), self.scheduler.floor))
+        return False
+
+    def source_succeeded(self, key, latency=None, size=None):
+        self.health.record_success(f"{key[0]}:{key[1]}", latency, size)
+
+    def source_failed(self, key, error):
+        source = f"{key[0]}:{key[1]}"
+        tripped = self.health.record_failure(source, error)
+        failures = self.health.get(source)[0].consecutive_failures
+
+        # Only the first failure and the breaker opening are logged, so a dead source doesn't flood the logs.
+        if tripped:
+            self.log.warning(f"[Source Health] {source} failed {failures} time(s) in a row, "
+                             f"backing off for {int(self.health.retry_in(source))}s: {error}")
+        elif failures == 1:
+            self.log.error(f"[Source Health] Unable to fetch {source}: {error}")
+        else:
+            self.log.debug(f"[Source Health] {source} failed again ({failures} in a row): {error}")
+
+    @Plugin.command('sourcehealth')
+    def source_health_command(self, event):
+        unhealthy = self.health.unhealthy()
+        if not unhealthy:
+            return event.msg.reply("All media sources are healthy.")
+
+        lines = []
+        for row, breaker in unhealthy:
+            state = breaker.state
+            if breaker.retry_in():
+                state += f", retry in {int(breaker.retry_in())}s"
+            last_success = row.last_success.strftime('%Y-%m-%d %H:%M') if row.last_success else "never"
+            lines.append(f"{row.source}\n  {row.consecutive_failures} failure(s) ({state}), last success: {last_success}"
+                         f"\n  {row.last_error}")
+
+        content = "\n".join(lines)
+        if len(content) > 1990:
+            content = content[:1987] + "..."
+        return event.msg.reply(f"```{content}```")
+
     def start_twitter_client(self):
         if len(CONFIG.media.twitter) == 0:
             self.log.info("Twitter Config empty, skipping.")
@@ -131,105 +274,269 @@ class MediaPlugin(Plugin):
 
         self.log.info("Twitter Client Started!")
 
-    def get_steam_news(self):
-        for app_id in self.steam_news_config.keys():
-            r = requests.get(
-                f"https://api.steampowered.com/ISteamNews/GetNewsForApp/v0002/?appid={app_id}&count=1&maxlength=400&format=json")
-            if not r.json():
-                return
-            post = r.json()['appnews']['newsitems'][0]
+    def fetch_steam_news(self, app_id):
+        try:
+            r = http.get("https://api.steampowered.com/ISteamNews/GetNewsForApp/v0002/",
+                         params={'appid': app_id, 'count': STEAM_NEWS_COUNT, 'maxlength': 400, 'format': 'json'},
+                         timeout=STEAM_FETCH_TIMEOUT)
+            r.raise_for_status()
+            news_items = r.json()['appnews']['newsitems']
+        except (requests.RequestException, ValueError, KeyError) as e:
+            self.source_failed(('steam', app_id), e)
+            return None
+
+        self.source_succeeded(('steam', app_id), r.elapsed.total_seconds(), len(r.content))
+        return news_items
+
+    def new_steam_news(self, app_id, news_items):
+        """
+        :param app_id: The steam app's ID.
+        :param news_items: The app's news items, as returned by the API (newest first).
+        :return: The items that haven't been posted yet, oldest first.
+        """
+        cache = SteamNewsCache.get_or_none(app=app_id)
+
+        # Never posted anything for this app, only start from the latest item.
+        if not cache:
+            return news_items[:1]
+
+        if cache.post_date:
+            return [post for post in reversed(news_items) if post['date'] > cache.post_date]
+
+        # Caches from before post_date was stored, everything above the cached post is new.
+        gids = [int(post['gid']) for post in news_items]
+        if cache.post_id not in gids:
+            return news_items[:1]
+        return list(reversed(news_items[:gids.index(cache.post_id)]))
+
+    def steam_news_message(self, app_id, post):
+        img = None
+        information = post['contents']
+        if post['contents'].startswith('{STEAM_CLAN_IMAGE}'):
+            hash = post['contents'].split(' ')[0]
+            img = f"https://cdn.akamai.steamstatic.com/steamcommunity/public/images/clans/{hash[19:]}"
+            information = information[len(hash):]
+        data = {
+            "content": "",
+            "embeds": [
+                {
+                    "type": "rich",
+                    "title": post['title'],
+                    "description": information,
+                    "color": 0xe9e9e9,
+                    "footer": {
+                        "text": f"Posted by {post['author']}"
+                    },
+                    "url": post['url']
+                }
+            ]
+        }
+        if img:
+            data['embeds'][0]['image'] = {'url': img}
+
+        app = steam_apps.get(app_id)
+        if app and app.name:
+            data['embeds'][0]['author'] = {'name': app.name}
+            if not img and app.header_image:
+                data['embeds'][0]['thumbnail'] = {'url': app.header_image}
+
+        return data
+
+    def post_steam_news(self, app_id, news_items):
+        """
+        :return: How many new items were posted.
+        """
+        new_items = self.new_steam_news(app_id, news_items)
+
+        for post in new_items:
+            data = self.steam_news_message(app_id, post)
+
+            # Queue the post and advance the cache together, so a crash can neither lose nor duplicate it.
+            with sqlite_db.atomic():
+                for webhook in self.steam_news_config[app_id]:
+                    self.outbox.enqueue_webhook(webhook, data)
+                SteamNewsCache.insert(app=app_id, post_id=post['gid'], post_date=post['date']).on_conflict_replace().execute()
+
+        self.outbox.wake()
+        return len(new_items)
+
+    def get_steam_news(self, app_ids=None):
+        if app_ids is None:
+            app_ids = list(self.steam_news_config.keys())
+
+        pool = Pool(STEAM_FETCH_CONCURRENCY)
+        fetches = {app_id: pool.spawn(self.fetch_steam_news, app_id) for app_id in app_ids}
+        pool.join()
+
+        for app_id, job in fetches.items():
+            timestamps = None
+            new_items = 0
+
+            if job.successful() and job.value:
+                timestamps = [post['date'] for post in job.value]
+                try:
+                    new_items = self.post_steam_news(app_id, job.value)
+                except Exception:
+                    self.log.exception(f"[Steam News] Failed to post news for APP ID {app_id}:")
+
+            self.scheduler.record(('steam', app_id), timestamps, new_items)
+
+    def fetch_rss_feeds(self, feed_urls, caches):
+        """
+        :param feed_urls: The feeds to download.
+        :param caches: {feed_url: RssCache} for the validators of feeds that have them.
+        :return: {feed_url: FeedResult} for every feed that finished before the cycle deadline.
+        """
+        if CONFIG.media.rss_worker_process:
+            return self.fetch_rss_feeds_in_worker(feed_urls, caches)
+
+        # Every feed is downloaded at once (bounded by the pool) so one slow publisher can't hold up the rest.
+        pool = Pool(RSS_FETCH_CONCURRENCY)
+        fetches = {}
+        for feed_url in feed_urls:
+            cache = caches.get(feed_url)
+            fetches[feed_url] = pool.spawn(fetch_feed, feed_url, cache and cache.etag, cache and cache.last_modified,
+                                           timeout=RSS_FETCH_TIMEOUT)
+
+        if not pool.join(timeout=RSS_CYCLE_DEADLINE):
+            timed_out = [feed_url for feed_url, job in fetches.items() if not job.ready()]
+            self.log.warning(f"[RSS] Cycle deadline reached, skipping {len(timed_out)} feed(s): {', '.join(timed_out)}")
+            pool.kill(block=False)
+
+        return {feed_url: job.value for feed_url, job in fetches.items() if job.successful()}
+
+    def fetch_rss_feeds_in_worker(self, feed_urls, caches):
+        job = {
+            'timeout': RSS_FETCH_TIMEOUT,
+            'concurrency': RSS_FETCH_CONCURRENCY,
+            'feeds': [{
+                'url': feed_url,
+                'etag': caches[feed_url].etag if feed_url in caches else None,
+                'last_modified': caches[feed_url].last_modified if feed_url in caches else None,
+            } for feed_url in feed_urls]
+        }
+
+        # A fresh process per batch, only the normalized entries come back over stdout.
+        process = subprocess.Popen([sys.executable, "-m", "PunyBot.utils.feed_worker"], stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        try:
+            output, _ = process.communicate(json.dumps(job).encode(), timeout=RSS_CYCLE_DEADLINE)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.communicate()
+            self.log.warning(f"[RSS] Feed worker missed the cycle deadline, skipping {len(feed_urls)} feed(s).")
+            return {}
+
+        if process.returncode != 0:
+            self.log.error(f"[RSS] Feed worker exited with code {process.returncode}, skipping {len(feed_urls)} feed(s).")
+            return {}
+
+        return {data['url']: FeedResult.deserialize(data) for data in json.loads(output)}
+
+    def save_rss_validators(self, feed_url, etag, last_modified):
+        if not (etag or last_modified):
+            return
 
-            cache = SteamNewsCache.get_or_none(app=app_id)
+        # An empty latest_post is never matched, so the next new article still gets posted.
+        RssCache.insert(url=feed_url, latest_post='', etag=etag, last_modified=last_modified).on_conflict(
+            conflict_target=[RssCache.url],
+            update={RssCache.etag: etag, RssCache.last_modified: last_modified}).execute()
 
-            if not cache:
-                SteamNewsCache.create(app=app_id, post_id=post["gid"])
-            elif int(post["gid"]) == cache.post_id:
-                continue
-            else:
-                cache.post_id = post["gid"]
-                cache.save()
+    def prune_rss_seen(self):
+        prune_before = datetime.now() - RSS_SEEN_TTL
+        RssSeenItem.delete().where(RssSeenItem.seen_at < prune_before).execute()
 
-            img = None
-            information = post['contents']
-            if post['contents'].startswith('{STEAM_CLAN_IMAGE}'):
-                hash = post['contents'].split(' ')[0]
-                img = f"https://cdn.akamai.steamstatic.com/steamcommunity/public/images/clans/{hash[19:]}"
-                information = information[len(hash):]
-            data = {
-                "content": "",
-                "embeds": [
-                    {
-                        "type": "rich",
-                        "title": post['title'],
-                        "description": information,
-                        "color": 0xe9e9e9,
-                        "footer": {
-                            "text": f"Posted by {post['author']}"
-                        },
-                        "url": post['url']
-                    }
-                ]
-            }
-            if img:
-                data['embeds'][0]['image'] = {'url': img}
+        for seen in self.rss_seen.values():
+            for guid in [guid for guid, seen_at in seen.items() if seen_at < prune_before]:
+                del seen[guid]
 
-            for webhook in self.steam_news_config[app_id]:
-                info = webhook.split("/")
-                self.bot.client.api.webhooks_token_execute(info[0], info[1], data=data)
+    def mark_rss_seen(self, feed_url, guids):
+        if not guids:
+            return
 
-    def check_rss(self):
+        now = datetime.now()
+        seen = self.rss_seen.setdefault(feed_url, {})
+        for guid in guids:
+            seen[guid] = now
 
-        def pubdate_to_timestamp(pub_date):
-            return int(parser.parse(pub_date).timestamp())
+        RssSeenItem.insert_many([{'url': feed_url, 'guid': guid, 'seen_at': now} for guid in guids]).on_conflict_replace().execute()
 
-        def sort_post_by_published(e):
-            return pubdate_to_timestamp(e['published'])
+    def check_rss(self, feed_urls=None):
+        if feed_urls is None:
+            feed_urls = list(self.rss_config.keys())
 
-        for feed_url in self.rss_config.keys():
-            feed = feedparser.parse(feed_url)
+        self.prune_rss_seen()
+        caches = {cache.url: cache for cache in RssCache.select().where(RssCache.url.in_(feed_urls))}
 
-            if not feed.get('entries') or len(feed['entries']) == 0:
-                continue
+        results = self.fetch_rss_feeds(feed_urls, caches)
 
-            unsorted_feed = [entry for entry in feed['entries'] if entry.get('published')]
+        for feed_url in feed_urls:
+            result = results.get(feed_url)
+            timestamps = None
+            new_items = 0
 
-            if len(unsorted_feed) == 0:
-                continue
+            if not result:
+                self.source_failed(('rss', feed_url), "No response before the cycle deadline")
+            elif result.error:
+                self.source_failed(('rss', feed_url), result.error)
+            else:
+                self.source_succeeded(('rss', feed_url), result.latency, result.size)
 
-            sorted_feed = sorted(unsorted_feed, key=sort_post_by_published, reverse=True)
+            if result and result.entries is not None:
+                try:
+                    timestamps, new_items = self.post_rss_feed(feed_url, result.entries)
+                    self.save_rss_validators(feed_url, result.etag, result.last_modified)
+                except Exception:
+                    self.log.exception(f"[RSS] Failed to post news for {feed_url}:")
 
-            domain = urlparse(sorted_feed[0]['link']).netloc
+            self.scheduler.record(('rss', feed_url), timestamps, new_items)
 
-            if pubdate_to_timestamp(sorted_feed[0]['published']) < int(datetime.now().timestamp() - 3600):
-                continue
+    def post_rss_feed(self, feed_url, entries):
+        """
+        :param feed_url: The feed the entries came from.
+        :param entries: The feed's normalized entries, in any order.
+        :return: The publish timestamps found in the feed, and how many new entries were posted.
+        """
+        entries = newest_entries(entries, RSS_MAX_ENTRIES)
 
-            cache = RssCache.get_or_none(url=feed_url)
+        if len(entries) == 0:
+            return None, 0
 
-            if cache:
-                if cache.latest_post == sorted_feed[0]['link']:
-                    continue
-                else:
-                    cache.latest_post = sorted_feed[0]['link']
-                    cache.save()
-            else:
-                RssCache.create(url=feed_url, latest_post=sorted_feed[0]['link'])
+        timestamps = [entry.timestamp for entry in entries]
+
+        seen = self.rss_seen.setdefault(feed_url, {})
+        cache = RssCache.get_or_none(url=feed_url)
+
+        # First poll since the seen index was introduced, treat everything up to the last posted article as seen.
+        if not seen and cache and cache.latest_post:
+            last_posted = next((entry.timestamp for entry in entries if entry.link == cache.latest_post), None)
+            if last_posted is not None:
+                self.mark_rss_seen(feed_url, [entry.guid for entry in entries if entry.timestamp <= last_posted])
 
-            author = None
-            if 'author_detail' in sorted_feed[0].keys():
-                author = f" by: {sorted_feed[0]['author_detail']['name']}"
+        cutoff = int(datetime.now().timestamp() - RSS_MAX_POST_AGE)
+        # Oldest first, so a burst of articles is posted in the order it was published.
+        unseen = [entry for entry in reversed(entries) if entry.timestamp >= cutoff and entry.guid not in seen]
 
-            title = re.sub("<[^>]*>", "", sorted_feed[0]['title'], count=0, flags=0)
+        if len(unseen) == 0:
+            return timestamps, 0
 
-            timestamp = pubdate_to_timestamp(sorted_feed[0]['published'])
+        with sqlite_db.atomic():
+            for entry in unseen:
+                author = f" by: {entry.author}" if entry.author else ''
 
-            content = Messages.rss_news_message.format(title=title, author=author or '', timestamp=timestamp, url=sorted_feed[0]['link'])
+                content = Messages.rss_news_message(title=entry.title, author=author, timestamp=entry.timestamp, url=entry.link)
 
-            # content = f"📰 | **{title}**{author or ''} (<t:{timestamp}:R>)\n\n** {sorted_feed[0]['link']} **"
+                # content = f"📰 | **{entry.title}**{author} (<t:{entry.timestamp}:R>)\n\n** {entry.link} **"
+
+                for channel in self.rss_config[feed_url]:
+                    self.outbox.enqueue_channel(channel, content=content)
+
+            self.mark_rss_seen(feed_url, [entry.guid for entry in unseen])
+
+            if cache:
+                cache.latest_post = unseen[-1].link
+                cache.save()
+            else:
+                RssCache.create(url=feed_url, latest_post=unseen[-1].link)
 
-            for channel in self.rss_config[feed_url]:
-                msg = self.bot.client.api.channels_messages_create(channel, content=content)
-                # If wanted to use announcement channels and have the bot auto-publish articles
-                # try:
-                #     self.bot.client.api.channels_messages_publish(channel, msg.id)
-                # except:
-                #     continue
+        self.outbox.wake()
+        return timestamps, len(unseen)
@@ -6,6 +6,7 @@ import gevent
 import requests
 from disco.api.http import APIException
 from disco.bot import Plugin
+from disco.types.application import InteractionType
 from disco.types.channel import PermissionOverwrite, PermissionOverwriteType
 from disco.types.message import ActionRow, MessageComponent, ButtonStyles, ComponentTypes, SelectOption, MessageEmbed, \
     MessageModal, TextInputStyles
@@ -14,6 +15,9 @@ from disco.types.permissions import Permissions
 from PunyBot import CONFIG
 from PunyBot.constants import PickupGamesConfig, Messages
 from PunyBot.models import PickupGame
+from PunyBot.utils.http import http
+from PunyBot.utils.interactions import interactions, route
+from PunyBot.utils.perf import TimedPlugin, perf
 from PunyBot.utils.timing import Eventual
 
 
@@ -44,7 +48,7 @@ def get_cfg_for_game(guild: int, key: str, value) -> tuple[str, PickupGamesConfi
             return dict_key, game_cfg
 
 
-class PickupPlugin(Plugin):
+class PickupPlugin(TimedPlugin):
     def load(self, ctx):
 
         if len(CONFIG.pickup_games) == 0:
@@ -53,10 +57,12 @@ class PickupPlugin(Plugin):
 
         self.info_cache = {}
 
-        self.timed_tasks = Eventual(self.action_games)
+        self.timed_tasks = Eventual(perf.wrap('schedule', f"{self.name}.action_games", self.action_games))
 
         self.spawn_later(5, self.queue_tasks)
 
+        interactions.register(self)
+
         super(PickupPlugin, self).load(ctx)
 
     # TODO: Check given server credentials to get server information during PUG creation.
@@ -68,8 +74,8 @@ class PickupPlugin(Plugin):
             return None
 
         try:
-            r = requests.get(
-                f"https://api.steampowered.com/IGameServersService/GetServerList/v1/?filter=\appid\\{cfg.game_id}&limit=5000&key={steam_key}")
+            r = http.get("https://api.steampowered.com/IGameServersService/GetServerList/v1/",
+                         params={'filter': f"\\appid\\{cfg.game_id}", 'limit': 5000, 'key': steam_key})
             if r.status_code == 403:
                 self.log.error(
                     f"Error: 403 Forbidden Given when trying to get server list for APP ID: {cfg.game_id}. Are you using a valid API Key?")
@@ -81,6 +87,9 @@ class PickupPlugin(Plugin):
             self.log.error(
                 "Error: JSONDecodeException when getting Server List from Steam's API. Possible bad response? Skipping...")
             return None
+        except requests.RequestException as e:
+            self.log.error(f"Error: Unable to reach Steam's API when getting the Server List: {e}")
+            return None
 
     def end_games(self):
         needs_to_end = list(PickupGame.select().where(
@@ -186,7 +195,7 @@ class PickupPlugin(Plugin):
         if information.get('server_info'):
             # TODO: Modify answer based on steam server response.
             # server = self.check_steam_server(information['server_info']['server_name'], config)
-            server_info = Messages.pickup_chat_server_information.format(
+            server_info = Messages.pickup_chat_server_information(
                 server_name=information['server_info']['server_name'],
                 server_password=information['server_info'].get('server_password') or 'None')
 
@@ -200,11 +209,11 @@ class PickupPlugin(Plugin):
         timestamp_expire = int(datetime.fromtimestamp(timestamp + 3600).timestamp())
         timestamp_prompt = int(datetime.fromtimestamp(timestamp + 1800).timestamp())
 
-        content = Messages.pickup_chat_channel_message_base.format(host_id=event.member.id,
-                                                                   game_region=information['region'],
-                                                                   server_info=server_info,
-                                                                   expire_timestamp=timestamp_expire,
-                                                                   action_time=timestamp_prompt)
+        content = Messages.pickup_chat_channel_message_base(host_id=event.member.id,
+                                                            game_region=information['region'],
+                                                            server_info=server_info,
+                                                            expire_timestamp=timestamp_expire,
+                                                            action_time=timestamp_prompt)
 
         control_buttons = ActionRow()
 
@@ -334,16 +343,15 @@ class PickupPlugin(Plugin):
 
             server_info = ""
             if game.extra_info.get('server'):
-                server_info = Messages.pickup_chat_server_information.format(
+                server_info = Messages.pickup_chat_server_information(
                     server_name=game.extra_info['server']['server_name'],
                     server_password=game.extra_info['server'].get('server_password') or 'None')
 
             # content = f"Me too"
-            content = Messages.pickup_chat_channel_message_base.format(server=server_info, host_id=game.host_id,
-                                                                       game_region=game.region, server_info=server_info,
-                                                                       expire_timestamp=int(game.end_time.timestamp()),
-                                                                       action_time=int(
-                                                                           game.next_action_time.timestamp()))
+            content = Messages.pickup_chat_channel_message_base(host_id=game.host_id,
+                                                                game_region=game.region, server_info=server_info,
+                                                                expire_timestamp=int(game.end_time.timestamp()),
+                                                                action_time=int(game.next_action_time.timestamp()))
 
             control_message.edit(content=content)
 
@@ -384,15 +392,9 @@ class PickupPlugin(Plugin):
 
     # The listener for active games.
     # This will listen for and respond to button presses from the control messages from active games.
-    @Plugin.listen('InteractionCreate')
+    @route(InteractionType.MESSAGE_COMPONENT, "ag_", prefix=True)
+    @route(InteractionType.MODAL_SUBMIT, "ag_", prefix=True)
     def ag_tiv_listener(self, event):
-
-        if event.raw_data['interaction']['type'] not in [3, 5]:
-            return
-
-        if not event.data.custom_id.startswith("ag_"):
-            return
-
         function = event.data.custom_id[3:]
 
         game = PickupGame.get_or_none(chat_channel_id=event.channel.id)
@@ -649,15 +651,9 @@ class PickupPlugin(Plugin):
 
     # This is the listener for game creation/role handout for LFG.
     # 4 == Reply to message || 7 == Edit message || 9 == Reply w/modal
-    @Plugin.listen('InteractionCreate')
+    @route(InteractionType.MESSAGE_COMPONENT, "pug_", prefix=True)
+    @route(InteractionType.MODAL_SUBMIT, "pug_", prefix=True)
     def pug_listener(self, event):
-
-        if event.raw_data['interaction']['type'] not in [3, 5]:
-            return
-
-        if not event.data.custom_id.startswith("pug_"):
-            return
-
         function = event.data.custom_id[4:]
 
         key, config = get_cfg_for_game(event.guild.id, 'active_games_channel', event.channel.id)
@@ -776,7 +772,7 @@ class PickupPlugin(Plugin):
 
             self.info_cache[event.member.id]['server_info'] = server_info
 
-            content = Messages.pickup_pregame_confirm_server_info.format(
+            content = Messages.pickup_pregame_confirm_server_info(
                 region=self.info_cache[event.member.id]['region'],
                 server_name=server_info['server_name'],
                 server_password=server_info.get('server_password') or "~~NONE~~")
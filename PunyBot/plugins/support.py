@@ -11,11 +11,13 @@ from disco.types.message import ActionRow, MessageComponent, ComponentTypes, But
 
 from PunyBot.constants import Messages, CONFIG
 from PunyBot.models.support import SupportTicket, TicketStatus
+from PunyBot.utils.interactions import interactions, route
+from PunyBot.utils.perf import TimedPlugin
 
 DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f%z"
 
 
-class SupportPlugin(Plugin):
+class SupportPlugin(TimedPlugin):
     def load(self, ctx):
 
         with open("./config/interactions.yaml", "r") as raw_interaction_components:
@@ -25,6 +27,12 @@ class SupportPlugin(Plugin):
 
         self.close_modal = interaction_components['components']['support_close_modal']
 
+        interactions.register(self)
+        # Answered by the wait_for_event calls while opening and closing tickets.
+        interactions.expect(self, InteractionType.MESSAGE_COMPONENT, "support_category_select")
+        interactions.expect(self, InteractionType.MESSAGE_COMPONENT, "close_reason_select")
+        interactions.expect(self, InteractionType.MODAL_SUBMIT, "support_close_reason_", prefix=True)
+
         super(SupportPlugin, self).load(ctx)
 
     def has_valid_support_roles(self, event, member=None):
@@ -128,7 +136,7 @@ class SupportPlugin(Plugin):
         # Return the message
         return event.channel.send_message(content=Messages.support_form_message, components=[components.to_dict()])
 
-    @Plugin.listen("InteractionCreate", conditional=lambda e: e.type == InteractionType.MESSAGE_COMPONENT and e.data.custom_id == "start_support")
+    @route(InteractionType.MESSAGE_COMPONENT, "start_support")
     def start_support(self, event):
         components = ActionRow()
 
@@ -171,7 +179,7 @@ class SupportPlugin(Plugin):
         subject_select.reply(type=9, modal=modal)
         return event.delete()
 
-    @Plugin.listen("InteractionCreate", conditional=lambda e: e.type == InteractionType.MODAL_SUBMIT and e.data.custom_id.startswith("support_form_submit_"))
+    @route(InteractionType.MODAL_SUBMIT, "support_form_submit_", prefix=True)
     def support_form_submit(self, event):
         current_timestamp = datetime.datetime.now(datetime.timezone.utc)
         data = {
@@ -211,7 +219,7 @@ class SupportPlugin(Plugin):
             return event.reply(type=4, content=Messages.support_form_submission_no_dm, embeds=[self.generate_ticket_embed(ticket, for_user=True)], flags=(1 << 6))
 
 
-    @Plugin.listen("InteractionCreate", conditional=lambda e: e.type == InteractionType.MESSAGE_COMPONENT and e.data.custom_id.startswith("ticket_"))
+    @route(InteractionType.MESSAGE_COMPONENT, "ticket_", prefix=True)
     def manage_ticket(self, event):
         ticket_id = None
         ticket_function = None
@@ -241,9 +249,9 @@ class SupportPlugin(Plugin):
                 ticket.save()
                 self.update_ticket_message(ticket, event)
                 try:
-                    user.open_dm().send_message(Messages.support_new_temp_channel_user.format(ticket=ticket, channel_id=support_channel.id))
+                    user.open_dm().send_message(Messages.support_new_temp_channel_user(ticket=ticket, channel_id=support_channel.id))
                 except APIException as e:
-                    support_channel.send_message(Messages.support_new_temp_channel_no_dm.format(ticket=ticket), allowed_mentions={'parse': ["users"]})
+                    support_channel.send_message(Messages.support_new_temp_channel_no_dm(ticket=ticket), allowed_mentions={'parse': ["users"]})
                 return event.reply(type=6)
             case "close":
 
@@ -342,7 +350,7 @@ class SupportPlugin(Plugin):
                                                          attachments=attachments)
                 ticket.save()
                 try:
-                    user.open_dm().send_message(Messages.support_ticket_close_user.format(ticket=ticket, close_reason=reason), attachments=attachments)
+                    user.open_dm().send_message(Messages.support_ticket_close_user(ticket=ticket, close_reason=reason), attachments=attachments)
                 except APIException as e:
                     pass
                 return
@@ -0,0 +1,229 @@
+import io
+import json
+import os
+import uuid
+from tempfile import SpooledTemporaryFile
+
+import requests
+from disco.api.http import APIException, Routes
+from disco.types.channel import Channel, ChannelType
+from disco.types.message import Message
+from gevent.pool import Pool
+
+from PunyBot.utils.http import http, ResponseTooLarge
+
+MIB = 1024 * 1024
+# Largest file a bot can upload into a guild, by the guild's boost tier.
+UPLOAD_LIMITS = {0: 10 * MIB, 1: 10 * MIB, 2: 50 * MIB, 3: 100 * MIB}
+# How many attachments of a message are downloaded at the same time.
+TRANSFER_CONCURRENCY = 4
+# Downloads stay in memory up to this size, anything larger is moved to a temp file on disk.
+SPOOL_MAX_MEMORY = 1 * MIB
+# (connect, read) timeouts for a single attachment download.
+DOWNLOAD_TIMEOUT = (5, 60)
+# How many channels a message is published to at the same time. Every channel has its own rate limit bucket in
+# disco, this keeps a large fan-out well below the global limit.
+PUBLISH_CONCURRENCY = 4
+
+FORUM_CHANNEL_TYPES = (ChannelType.GUILD_FORUM, ChannelType.GUILD_MEDIA)
+
+
+class AttachmentError(Exception):
+    pass
+
+
+class AttachmentTooLarge(AttachmentError):
+    def __init__(self, filename, limit, size=None):
+        self.filename = filename
+        self.limit = limit
+        self.size = size
+        size = f"{size / MIB:.1f} MB" if size else "too large"
+        super(AttachmentTooLarge, self).__init__(
+            f"{filename} is {size}, over the {limit / MIB:.0f} MB upload limit of the channel")
+
+
+def upload_limit(guild):
+    """
+    :param guild: The destination guild, or None to use the limit of a guild without boosts.
+    """
+    tier = guild.premium_tier if guild and guild.premium_tier else 0
+    return UPLOAD_LIMITS.get(tier, UPLOAD_LIMITS[0])
+
+
+class MultipartBody(object):
+    """
+    multipart/form-data body of a message with files. The files are read as the request is sent, so only one block
+    of them is in memory at a time, instead of requests building the whole body in memory. Each body tracks its own
+    position, so several can read the same files at once.
+    """
+
+    def __init__(self, payload, files):
+        boundary = uuid.uuid4().hex
+        self.content_type = f"multipart/form-data; boundary={boundary}"
+
+        self.parts = [io.BytesIO(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="payload_json"\r\n'
+            f'Content-Type: application/json\r\n\r\n{json.dumps(payload)}\r\n'.encode())]
+
+        for idx, (filename, fileobj) in enumerate(files):
+            filename = filename.replace('"', '%22').replace('\r', '').replace('\n', '')
+            self.parts.append(io.BytesIO(
+                f'--{boundary}\r\nContent-Disposition: form-data; name="files[{idx}]"; filename="{filename}"\r\n'
+                f'Content-Type: application/octet-stream\r\n\r\n'.encode()))
+            self.parts.append(fileobj)
+            self.parts.append(io.BytesIO(b'\r\n'))
+
+        self.parts.append(io.BytesIO(f'--{boundary}--\r\n'.encode()))
+
+        self.length = 0
+        for part in self.parts:
+            self.length += part.seek(0, os.SEEK_END)
+        self.rewind()
+
+    def rewind(self):
+        self.index = 0
+        self.offset = 0
+
+    def __len__(self):
+        # requests measures the body before every attempt, and disco retries failed requests with the same body.
+        self.rewind()
+        return self.length
+
+    def __iter__(self):
+        return iter(lambda: self.read(io.DEFAULT_BUFFER_SIZE), b'')
+
+    def read(self, size=-1):
+        while self.index < len(self.parts):
+            # Seeking and reading don't yield to other greenlets, so other bodies can't move the file in between.
+            part = self.parts[self.index]
+            part.seek(self.offset)
+            data = part.read(size)
+            if data:
+                self.offset += len(data)
+                return data
+            self.index += 1
+            self.offset = 0
+        return b''
+
+
+class AttachmentTransfer(object):
+    """
+    Copies the attachments of a message into another channel. Sizes are checked against the destination's upload
+    limit before anything is downloaded, the downloads run in parallel into spooled temp files, and the upload is
+    streamed from those files.
+    """
+
+    def __init__(self, attachments, limit):
+        """
+        :param attachments: MessageAttachment objects, e.g. `message.attachments.values()`.
+        :param limit: Largest file the destination accepts, see `upload_limit`.
+        """
+        self.attachments = list(attachments)
+        self.limit = limit
+        # [(filename, file object)] once downloaded.
+        self.files = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def check(self):
+        """
+        :raises AttachmentTooLarge: For the first attachment the destination wouldn't accept.
+        """
+        for attachment in self.attachments:
+            if attachment.size and attachment.size > self.limit:
+                raise AttachmentTooLarge(attachment.filename, self.limit, attachment.size)
+
+    def download(self):
+        """
+        :raises AttachmentError: If any attachment is too large or couldn't be downloaded.
+        """
+        self.check()
+
+        pool = Pool(TRANSFER_CONCURRENCY)
+        jobs = [pool.spawn(self.fetch, attachment) for attachment in self.attachments]
+        pool.join()
+
+        self.files = [(attachment.filename, job.value) for attachment, job in zip(self.attachments, jobs)
+                      if not isinstance(job.value, AttachmentError)]
+
+        for job in jobs:
+            if isinstance(job.value, AttachmentError):
+                self.close()
+                raise job.value
+
+        return self
+
+    def fetch(self, attachment):
+        # Errors are returned instead of raised, so the pool doesn't print them before they are handled.
+        fileobj = SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+        try:
+            r = http.get(attachment.url, fileobj=fileobj, max_size=self.limit, timeout=DOWNLOAD_TIMEOUT)
+            r.raise_for_status()
+        except ResponseTooLarge:
+            fileobj.close()
+            return AttachmentTooLarge(attachment.filename, self.limit)
+        except requests.RequestException as e:
+            fileobj.close()
+            return AttachmentError(f"Unable to download {attachment.filename}: {e}")
+
+        fileobj.seek(0)
+        return fileobj
+
+    def send(self, channel, content=None, thread_name=None, allowed_mentions=None):
+        """
+        Sends the content with the downloaded files, starting a thread named `thread_name` in forum channels.
+
+        :return: The Message, or the thread Channel in forum channels.
+        """
+        payload = {'content': content}
+        if allowed_mentions:
+            payload['allowed_mentions'] = allowed_mentions
+        if self.files:
+            payload['attachments'] = [{'id': idx, 'filename': filename} for idx, (filename, _) in
+                                      enumerate(self.files)]
+
+        if channel.type in FORUM_CHANNEL_TYPES:
+            r = self.post(channel.client, Routes.CHANNELS_THREAD_CREATE, channel.id,
+                          {'name': thread_name, 'message': payload})
+            return Channel.create(channel.client, r.json())
+
+        r = self.post(channel.client, Routes.CHANNELS_MESSAGES_CREATE, channel.id, payload)
+        return Message.create(channel.client, r.json())
+
+    def publish(self, channels, content=None, thread_name=None, allowed_mentions=None):
+        """
+        Sends the content with the downloaded files to every channel concurrently.
+
+        :return: [(channel, sent, error)] in the order of `channels`, with either the result of `send` or the
+            exception it raised.
+        """
+        pool = Pool(PUBLISH_CONCURRENCY)
+        jobs = [pool.spawn(self.publish_to, channel, content, thread_name, allowed_mentions) for channel in channels]
+        pool.join()
+
+        # publish_to only returns the errors it expects, anything else kills its greenlet and is taken from there.
+        return [(channel, ) + job.value if job.successful() else (channel, None, job.exception)
+                for channel, job in zip(channels, jobs)]
+
+    def publish_to(self, channel, content, thread_name, allowed_mentions):
+        # Errors are returned instead of raised, so one failing channel doesn't stop the others.
+        try:
+            return self.send(channel, content, thread_name, allowed_mentions), None
+        except (APIException, requests.RequestException) as e:
+            return None, e
+
+    def post(self, client, route, channel_id, payload):
+        if not self.files:
+            return client.api.http(route, dict(channel=channel_id), json=payload)
+
+        body = MultipartBody(payload, self.files)
+        return client.api.http(route, dict(channel=channel_id), data=body, headers={'Content-Type': body.content_type})
+
+    def close(self):
+        for _, fileobj in self.files:
+            fileobj.close()
+        self.files = []
@@ -0,0 +1,97 @@
+import random
+import time
+
+
+class CircuitState:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+
+class CircuitBreaker(object):
+    """
+    Opens after `failure_threshold` consecutive failures and stays open for an exponentially growing, jittered
+    backoff. Once that passes a single probe is let through (half-open), which closes the breaker on success or
+    re-opens it with a longer backoff on failure. A probe that hasn't reported back after `probe_timeout` seconds is
+    given up on and another one is let through.
+    """
+
+    def __init__(self, failure_threshold=3, base_backoff=60, max_backoff=3600, jitter=0.2, probe_timeout=300,
+                 failures=0, trips=0, open_until=None):
+        self.failure_threshold = failure_threshold
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.probe_timeout = probe_timeout
+
+        self.failures = failures
+        # How many times in a row the breaker has opened, used as the backoff exponent.
+        self.trips = trips
+        self.open_until = open_until
+        self.state = CircuitState.OPEN if open_until else CircuitState.CLOSED
+        # When the current half-open probe was let through, None once it is given up on.
+        self.probe_started = None
+
+    def allow(self):
+        """
+        :return: Whether a request should be made right now.
+        """
+        if self.state == CircuitState.CLOSED:
+            return True
+
+        now = time.time()
+        if self.state == CircuitState.OPEN and now >= self.open_until:
+            self.state = CircuitState.HALF_OPEN
+            self.probe_started = now
+            return True
+
+        # The probe's greenlet was killed or is stuck, without a new probe the breaker would never close again.
+        if self.state == CircuitState.HALF_OPEN and (self.probe_started is None or
+                                                     now - self.probe_started >= self.probe_timeout):
+            self.probe_started = now
+            return True
+
+        # Either still open, or the half-open probe hasn't reported back yet.
+        return False
+
+    def cancel_probe(self):
+        """
+        Gives up on a half-open probe that will never report back, so the next `allow` lets a new one through.
+        """
+        if self.state == CircuitState.HALF_OPEN:
+            self.probe_started = None
+
+    def retry_in(self):
+        """
+        :return: Seconds until the breaker lets a probe through, 0 if it isn't open.
+        """
+        if self.state != CircuitState.OPEN:
+            return 0
+        return max(self.open_until - time.time(), 0)
+
+    def record_success(self):
+        self.failures = 0
+        self.trips = 0
+        self.open_until = None
+        self.probe_started = None
+        self.state = CircuitState.CLOSED
+
+    def record_failure(self):
+        """
+        :return: True if this failure opened the breaker.
+        """
+        self.failures += 1
+
+        if self.state == CircuitState.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.trip()
+            return True
+        return False
+
+    def trip(self):
+        backoff = min(self.base_backoff * (2 ** self.trips), self.max_backoff)
+        backoff *= 1 + random.uniform(-self.jitter, self.jitter)
+
+        self.trips += 1
+        self.open_until = time.time() + backoff
+        self.probe_started = None
+        self.state = CircuitState.OPEN
@@ -0,0 +1,83 @@
+import hashlib
+import json
+from datetime import datetime
+
+from PunyBot.models import CommandSyncState
+
+
+def command_key(command):
+    return int(command.get('type', 1)), command['name']
+
+
+def command_hash(commands):
+    """
+    :return: A hash of the commands that doesn't depend on their order or the order of their keys.
+    """
+    canonical = json.dumps(sorted(commands, key=command_key), sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class CommandSync(object):
+    """
+    Writes application commands only when they differ from what was last written to that scope, so reconnects
+    don't spend the command-write rate limit on syncs that change nothing.
+    """
+
+    def __init__(self, client, log):
+        self.client = client
+        self.log = log
+
+    def scope(self, guild_id=None):
+        application = self.client.state.me.id
+        return f"guild:{application}:{guild_id}" if guild_id else f"global:{application}"
+
+    def is_synced(self, scope, commands_hash):
+        state = CommandSyncState.get_or_none(scope=scope)
+        return state is not None and state.hash == commands_hash
+
+    def mark_synced(self, scope, commands_hash):
+        CommandSyncState.insert(scope=scope, hash=commands_hash, synced_at=datetime.now()).on_conflict_replace().execute()
+
+    def sync_global(self, commands, force=False):
+        """
+        :param commands: Every global command, as sent to the bulk overwrite endpoint.
+        :param force: Write the commands even if they haven't changed.
+        :return: The registered commands, or None if nothing had to be written.
+        """
+        scope = self.scope()
+        commands_hash = command_hash(commands)
+
+        if not force and self.is_synced(scope, commands_hash):
+            self.log.info(f"{len(commands)} global command(s) unchanged, skipping registration.")
+            return None
+
+        registered = self.client.api.applications_global_commands_bulk_overwrite(commands)
+        self.mark_synced(scope, commands_hash)
+        return registered
+
+    def sync_guild(self, guild_id, commands, force=False):
+        """
+        Adds/updates the given commands in a guild, leaving the guild's other commands alone.
+
+        :param commands: The commands this bot manages in the guild.
+        :param force: Write the commands even if they haven't changed.
+        :return: The guild's registered commands, or None if nothing had to be written.
+        """
+        scope = self.scope(guild_id)
+        commands_hash = command_hash(commands)
+
+        if not force and self.is_synced(scope, commands_hash):
+            return None
+
+        managed = {command_key(command): command for command in commands}
+        merged = []
+        for existing in self.client.api.applications_guild_commands_get(guild_id):
+            existing = existing.to_dict()
+            # Commands we manage are replaced below, everything else is kept as it is.
+            if command_key(existing) not in managed:
+                merged.append(existing)
+        merged.extend(commands)
+
+        registered = self.client.api.applications_guild_commands_bulk_overwrite(guild_id, merged)
+        self.mark_synced(scope, commands_hash)
+        return registered
@@ -0,0 +1,102 @@
+import json
+from collections import OrderedDict
+
+import gevent
+from disco.api.http import APIException
+
+# How long embeds are collected before they are posted together.
+CONTROL_LOG_INTERVAL = 5
+# Most embeds Discord accepts in one message.
+CONTROL_LOG_EMBEDS_PER_MESSAGE = 10
+# Most characters Discord accepts across all embeds of one message.
+CONTROL_LOG_CHARACTERS_PER_MESSAGE = 6000
+# Distinct embeds kept between flushes, anything past this is only counted.
+CONTROL_LOG_MAX_PENDING = 200
+
+
+def embed_length(embed):
+    length = len(embed.title or "") + len(embed.description or "") + len(embed.footer.text or "")
+    for field in embed.fields:
+        length += len(field.name or "") + len(field.value or "")
+    return length
+
+
+class ControlLog(object):
+    """
+    Posts embeds to the logging channel in the background. `queue` never makes a request, embeds are collected for
+    `CONTROL_LOG_INTERVAL` seconds and posted up to ten per message. Identical embeds queued in the same interval are
+    posted once with a count, so an error storm turns into a single line.
+    """
+
+    def __init__(self, client, log, channel_id):
+        self.client = client
+        self.log = log
+        self.channel_id = channel_id
+        # {embed without its timestamp: [embed, count]}
+        self.pending = OrderedDict()
+        self.dropped = 0
+        self.flusher = None
+
+    def queue(self, embed):
+        if not self.channel_id:
+            return
+
+        data = embed.to_dict()
+        data.pop('timestamp', None)
+        key = json.dumps(data, sort_keys=True, default=str)
+
+        if key in self.pending:
+            self.pending[key][1] += 1
+        elif len(self.pending) >= CONTROL_LOG_MAX_PENDING:
+            self.dropped += 1
+        else:
+            self.pending[key] = [embed, 1]
+
+        if not self.flusher:
+            self.flusher = gevent.spawn_later(CONTROL_LOG_INTERVAL, self.flush)
+
+    def take(self):
+        """
+        :return: The pending embeds with their counts in their footers, emptying the queue.
+        """
+        embeds = []
+        for embed, count in self.pending.values():
+            if count > 1:
+                embed.set_footer(text=f"{embed.footer.text} | Repeated {count} times")
+            embeds.append(embed)
+        self.pending = OrderedDict()
+
+        if self.dropped:
+            self.log.warning(f"[Control Log] Dropped {self.dropped} log embed(s), too many were queued.")
+            self.dropped = 0
+
+        return embeds
+
+    def batches(self, embeds):
+        batch = []
+        length = 0
+        for embed in embeds:
+            size = embed_length(embed)
+            if batch and (len(batch) == CONTROL_LOG_EMBEDS_PER_MESSAGE or
+                          length + size > CONTROL_LOG_CHARACTERS_PER_MESSAGE):
+                yield batch
+                batch = []
+                length = 0
+            batch.append(embed)
+            length += size
+
+        if batch:
+            yield batch
+
+    def flush(self):
+        try:
+            for batch in self.batches(self.take()):
+                try:
+                    self.client.api.channels_messages_create(self.channel_id, embeds=batch)
+                except APIException:
+                    self.log.exception('Failed to send control message:')
+        finally:
+            # Embeds queued while posting start the next interval.
+            self.flusher = None
+            if self.pending:
+                self.flusher = gevent.spawn_later(CONTROL_LOG_INTERVAL, self.flush)
@@ -0,0 +1,69 @@
+import time
+
+import gevent
+from disco.api.http import APIException
+from disco.util.snowflake import to_unix
+
+# How long message IDs are collected per channel before they are deleted together.
+DELETE_BATCH_WINDOW = 1
+# Most messages the bulk delete route accepts in one request.
+BULK_DELETE_MAX = 100
+# Messages older than this can't be bulk deleted, with a minute to spare for slow requests.
+BULK_DELETE_MAX_AGE = 14 * 24 * 3600 - 60
+
+
+class DeletionBatcher(object):
+    """
+    Deletes messages in batches per channel. IDs are collected for `DELETE_BATCH_WINDOW` seconds and deleted by one
+    greenlet per channel, so all deletes of a channel go through its rate limit bucket one after the other.
+    """
+
+    def __init__(self, client, log):
+        self.client = client
+        self.log = log
+        # {channel id: [message id]} waiting to be deleted.
+        self.pending = {}
+        # Channels with a greenlet deleting their pending messages.
+        self.flushing = set()
+
+    def queue(self, channel_id, message_id):
+        self.pending.setdefault(channel_id, []).append(message_id)
+
+        if channel_id not in self.flushing:
+            self.flushing.add(channel_id)
+            gevent.spawn_later(DELETE_BATCH_WINDOW, self.flush, channel_id)
+
+    def flush(self, channel_id):
+        try:
+            # Messages queued while a batch is being deleted are picked up by the next round.
+            while self.pending.get(channel_id):
+                # Duplicate IDs make the bulk route fail.
+                message_ids = list(dict.fromkeys(self.pending.pop(channel_id)))
+                for start in range(0, len(message_ids), BULK_DELETE_MAX):
+                    self.delete(channel_id, message_ids[start:start + BULK_DELETE_MAX])
+        finally:
+            self.flushing.discard(channel_id)
+
+    def delete(self, channel_id, message_ids):
+        cutoff = time.time() - BULK_DELETE_MAX_AGE
+        recent = [message_id for message_id in message_ids if to_unix(message_id) > cutoff]
+        old = [message_id for message_id in message_ids if to_unix(message_id) <= cutoff]
+
+        # The bulk route needs at least two messages, anything else is deleted one by one.
+        if len(recent) >= 2:
+            try:
+                self.client.api.channels_messages_delete_bulk(channel_id, recent)
+            except APIException as e:
+                self.log.warning(f"[Auto Delete] Bulk delete of {len(recent)} message(s) in channel {channel_id} "
+                                 f"failed, deleting them one by one: {e}")
+                old += recent
+        else:
+            old += recent
+
+        for message_id in old:
+            try:
+                self.client.api.channels_messages_delete(channel_id, message_id)
+            except APIException as e:
+                # Already deleted by someone else.
+                if e.code != 10008:
+                    self.log.warning(f"[Auto Delete] Unable to delete message {message_id} in channel {channel_id}: {e}")
@@ -0,0 +1,33 @@
+"""
+Fetches and parses a batch of feeds outside of the bot process, so feedparser's CPU time never blocks the gateway.
+
+Reads a JSON object from stdin:
+    {"timeout": [connect, read], "concurrency": int, "feeds": [{"url": str, "etag": str, "last_modified": str}, ...]}
+and writes a JSON list of serialized FeedResults to stdout.
+
+Usage: python -m PunyBot.utils.feed_worker
+"""
+import json
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from PunyBot.utils.feeds import fetch_feed
+
+
+def run(job):
+    timeout = tuple(job['timeout'])
+
+    def fetch(feed):
+        return fetch_feed(feed['url'], feed.get('etag'), feed.get('last_modified'), timeout=timeout)
+
+    with ThreadPoolExecutor(max_workers=job['concurrency']) as executor:
+        return [result.serialize() for result in executor.map(fetch, job['feeds'])]
+
+
+def main():
+    job = json.load(sys.stdin)
+    json.dump(run(job), sys.stdout)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+import calendar
+import heapq
+import re
+from operator import attrgetter
+
+import dateutil.parser as parser
+import feedparser
+import requests
+
+from PunyBot.utils.http import http
+
+HTML_TAG = re.compile("<[^>]*>")
+
+# (connect, read) timeouts for a single feed download.
+FETCH_TIMEOUT = (5, 20)
+# Largest feed document that is downloaded.
+FETCH_MAX_SIZE = 5 * 1024 * 1024
+
+
+class FeedEntry(object):
+    """
+    The parts of a feedparser entry needed to post it, with the publish date already converted to a timestamp.
+    """
+    __slots__ = ('guid', 'link', 'title', 'author', 'timestamp')
+
+    def __init__(self, guid, link, title, author, timestamp):
+        self.guid = guid
+        self.link = link
+        self.title = title
+        self.author = author
+        self.timestamp = timestamp
+
+    def serialize(self):
+        return [self.guid, self.link, self.title, self.author, self.timestamp]
+
+
+class FeedResult(object):
+    """
+    The outcome of downloading and parsing a single feed.
+    """
+    __slots__ = ('url', 'entries', 'not_modified', 'etag', 'last_modified', 'error', 'latency', 'size')
+
+    def __init__(self, url, entries=None, not_modified=False, etag=None, last_modified=None, error=None,
+                 latency=None, size=None):
+        self.url = url
+        self.entries = entries
+        self.not_modified = not_modified
+        self.etag = etag
+        self.last_modified = last_modified
+        self.error = error
+        # Seconds until the response arrived and its body size in bytes, when there was a response.
+        self.latency = latency
+        self.size = size
+
+    def serialize(self):
+        return {
+            'url': self.url,
+            'entries': [entry.serialize() for entry in self.entries] if self.entries is not None else None,
+            'not_modified': self.not_modified,
+            'etag': self.etag,
+            'last_modified': self.last_modified,
+            'error': self.error,
+            'latency': self.latency,
+            'size': self.size,
+        }
+
+    @classmethod
+    def deserialize(cls, data):
+        entries = [FeedEntry(*entry) for entry in data['entries']] if data['entries'] is not None else None
+        return cls(data['url'], entries, data['not_modified'], data['etag'], data['last_modified'], data['error'],
+                   data.get('latency'), data.get('size'))
+
+
+def entry_timestamp(entry):
+    # feedparser has already parsed most dates into a UTC struct_time, dateutil only handles what it couldn't.
+    if entry.get('published_parsed'):
+        return calendar.timegm(entry['published_parsed'])
+
+    if entry.get('published'):
+        try:
+            return int(parser.parse(entry['published']).timestamp())
+        except (ValueError, OverflowError):
+            return None
+
+    return None
+
+
+def normalize_entries(feed):
+    entries = []
+
+    for entry in feed.get('entries', []):
+        if not entry.get('link'):
+            continue
+
+        timestamp = entry_timestamp(entry)
+        if timestamp is None:
+            continue
+
+        author = None
+        if entry.get('author_detail'):
+            author = entry['author_detail'].get('name')
+
+        entries.append(FeedEntry(entry.get('id') or entry['link'], entry['link'],
+                                 HTML_TAG.sub("", entry.get('title', '')), author, timestamp))
+
+    return entries
+
+
+def newest_entries(entries, count):
+    """
+    :param entries: FeedEntry objects in any order.
+    :param count: How many entries to keep.
+    :return: The newest `count` entries, newest first.
+    """
+    return heapq.nlargest(count, entries, key=attrgetter('timestamp'))
+
+
+def fetch_feed(url, etag=None, last_modified=None, timeout=FETCH_TIMEOUT):
+    """
+    Downloads and parses a feed, sending a conditional GET when validators are given.
+
+    :return: FeedResult, with `entries` set unless the feed was unchanged or failed to download.
+    """
+    headers = {}
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+
+    try:
+        r = http.get(url, headers=headers, timeout=timeout, max_size=FETCH_MAX_SIZE)
+        r.raise_for_status()
+    except requests.RequestException as e:
+        return FeedResult(url, error=str(e))
+
+    latency = r.elapsed.total_seconds()
+
+    # Nothing new since the last poll, no need to parse anything.
+    if r.status_code == 304:
+        return FeedResult(url, not_modified=True, etag=etag, last_modified=last_modified, latency=latency, size=0)
+
+    response_headers = {'content-location': url}
+    if r.headers.get('content-type'):
+        response_headers['content-type'] = r.headers['content-type']
+
+    return FeedResult(url, normalize_entries(feedparser.parse(r.content, response_headers=response_headers)),
+                      etag=r.headers.get('ETag'), last_modified=r.headers.get('Last-Modified'),
+                      latency=latency, size=len(r.content))
@@ -0,0 +1,84 @@
+from datetime import datetime
+
+from PunyBot.models import SourceHealth
+from PunyBot.utils.circuit import CircuitBreaker, CircuitState
+
+# Weight of the newest sample in the latency/size moving averages.
+AVERAGE_WEIGHT = 0.2
+
+
+class SourceHealthTracker(object):
+    """
+    Keeps a circuit breaker per polled source, backed by the source_health table so backoffs survive restarts.
+    """
+
+    def __init__(self, failure_threshold=3, base_backoff=60, max_backoff=3600, probe_timeout=300):
+        self.failure_threshold = failure_threshold
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        # A probe poll that died before recording its result is given up on after this long.
+        self.probe_timeout = probe_timeout
+        self.rows = {}
+        self.breakers = {}
+
+        for row in SourceHealth.select():
+            self.rows[row.source] = row
+            self.breakers[row.source] = self.new_breaker(row)
+
+    def new_breaker(self, row=None):
+        open_until = row.open_until.timestamp() if row and row.open_until else None
+        return CircuitBreaker(self.failure_threshold, self.base_backoff, self.max_backoff,
+                              probe_timeout=self.probe_timeout, failures=row.consecutive_failures if row else 0,
+                              trips=row.trips if row else 0, open_until=open_until)
+
+    def get(self, source):
+        if source not in self.rows:
+            self.rows[source] = SourceHealth(source=source)
+            self.breakers[source] = self.new_breaker()
+        return self.rows[source], self.breakers[source]
+
+    def allow(self, source):
+        return self.get(source)[1].allow()
+
+    def retry_in(self, source):
+        return self.get(source)[1].retry_in()
+
+    def record_success(self, source, latency=None, size=None):
+        row, breaker = self.get(source)
+        breaker.record_success()
+
+        if latency is not None:
+            row.avg_latency = latency if not row.avg_latency else row.avg_latency + AVERAGE_WEIGHT * (latency - row.avg_latency)
+        if size is not None:
+            row.avg_bytes = size if not row.avg_bytes else row.avg_bytes + AVERAGE_WEIGHT * (size - row.avg_bytes)
+
+        row.last_success = datetime.now()
+        self.save(row, breaker)
+
+    def record_failure(self, source, error):
+        """
+        :return: True if this failure opened the source's breaker.
+        """
+        row, breaker = self.get(source)
+        tripped = breaker.record_failure()
+
+        row.last_failure = datetime.now()
+        row.last_error = str(error)[:500]
+        self.save(row, breaker)
+        return tripped
+
+    def save(self, row, breaker):
+        row.consecutive_failures = breaker.failures
+        row.trips = breaker.trips
+        row.open_until = datetime.fromtimestamp(breaker.open_until) if breaker.open_until else None
+        # The primary key is the source name, so a new source's first save updates nothing and needs an insert.
+        if not row.save():
+            row.save(force_insert=True)
+
+    def unhealthy(self):
+        """
+        :return: (SourceHealth, CircuitBreaker) for every source currently failing, worst first.
+        """
+        failing = [(row, self.breakers[source]) for source, row in self.rows.items()
+                   if row.consecutive_failures or self.breakers[source].state != CircuitState.CLOSED]
+        return sorted(failing, key=lambda pair: pair[0].consecutive_failures, reverse=True)
@@ -0,0 +1,120 @@
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# (connect, read) timeouts used when a caller doesn't pass its own.
+DEFAULT_TIMEOUT = (5, 15)
+# Largest response body read into memory when a caller doesn't pass its own cap.
+DEFAULT_MAX_SIZE = 10 * 1024 * 1024
+# Hosts kept in the pool, and keep-alive connections kept per host.
+POOL_HOSTS = 16
+POOL_CONNECTIONS_PER_HOST = 8
+# Idempotent requests are retried this often on connection errors and 502/503/504s, with a growing delay.
+RETRIES = 2
+RETRY_BACKOFF = 0.5
+RETRY_STATUSES = (502, 503, 504)
+CHUNK_SIZE = 64 * 1024
+
+
+class ResponseTooLarge(requests.RequestException):
+    pass
+
+
+class HostMetrics(object):
+    __slots__ = ('requests', 'errors', 'total_latency', 'max_latency', 'last_error')
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.last_error = None
+
+    @property
+    def average_latency(self):
+        return self.total_latency / self.requests if self.requests else 0.0
+
+
+class HttpClient(object):
+    """
+    Session shared by every outbound (non-Discord) request, so each host's keep-alive connections are reused
+    instead of doing a fresh TLS handshake per call. Cooperative under gevent, as the bot runs monkey patched.
+    """
+
+    def __init__(self):
+        retry = Retry(total=RETRIES, connect=RETRIES, read=RETRIES, status=RETRIES, backoff_factor=RETRY_BACKOFF,
+                      status_forcelist=RETRY_STATUSES, allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+                      raise_on_status=False, respect_retry_after_header=True)
+        adapter = HTTPAdapter(pool_connections=POOL_HOSTS, pool_maxsize=POOL_CONNECTIONS_PER_HOST, max_retries=retry)
+
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        # {host: HostMetrics}
+        self.metrics = {}
+
+    def request(self, method, url, timeout=DEFAULT_TIMEOUT, max_size=DEFAULT_MAX_SIZE, fileobj=None, **kwargs):
+        """
+        Makes a request and reads its body, giving up once it grows past `max_size` bytes.
+
+        :param fileobj: The body is written here as it arrives instead of being kept in memory, leaving the content
+            of the response empty.
+        :return: The response, with its content already read. raise_for_status is left to the caller.
+        :raises requests.RequestException: On connection errors and timeouts, or ResponseTooLarge.
+        """
+        metrics = self.metrics.setdefault(urlsplit(url).hostname, HostMetrics())
+        start = time.perf_counter()
+
+        try:
+            r = self.session.request(method, url, timeout=timeout, stream=True, **kwargs)
+            try:
+                r._content = self.read(r, max_size, fileobj)
+            finally:
+                r.close()
+        except requests.RequestException as e:
+            metrics.errors += 1
+            metrics.last_error = str(e) or e.__class__.__name__
+            raise
+        finally:
+            latency = time.perf_counter() - start
+            metrics.requests += 1
+            metrics.total_latency += latency
+            metrics.max_latency = max(metrics.max_latency, latency)
+
+        if r.status_code >= 500 or r.status_code == 429:
+            metrics.errors += 1
+            metrics.last_error = f"HTTP {r.status_code}"
+
+        return r
+
+    def read(self, r, max_size, fileobj=None):
+        length = r.headers.get('Content-Length')
+        if max_size and length and length.isdigit() and int(length) > max_size:
+            raise ResponseTooLarge(f"Response from {r.url} is {length} bytes, over the {max_size} byte limit",
+                                   response=r)
+
+        body = bytearray()
+        size = 0
+        for chunk in r.iter_content(CHUNK_SIZE):
+            size += len(chunk)
+            if max_size and size > max_size:
+                raise ResponseTooLarge(f"Response from {r.url} is over the {max_size} byte limit", response=r)
+
+            if fileobj is not None:
+                fileobj.write(chunk)
+            else:
+                body += chunk
+        return bytes(body)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def head(self, url, **kwargs):
+        return self.request("HEAD", url, **kwargs)
+
+
+# Shared by every plugin.
+http = HttpClient()
@@ -0,0 +1,151 @@
+from disco.types.application import InteractionType
+
+from PunyBot.utils.perf import perf
+
+# Interaction types routed by command name, everything else is routed by custom_id.
+NAMED_TYPES = (InteractionType.APPLICATION_COMMAND, InteractionType.APPLICATION_COMMAND_AUTOCOMPLETE)
+
+
+def route(interaction_type, key, prefix=False):
+    """
+    Marks a plugin method as the handler for an interaction, picked up by `InteractionRouter.register`.
+
+    :param interaction_type: The InteractionType to handle.
+    :param key: The command name for commands/autocomplete, or the custom_id for components/modals.
+    :param prefix: Match every custom_id starting with `key` instead of only `key` itself.
+    """
+    def deco(func):
+        if not hasattr(func, 'interaction_routes'):
+            func.interaction_routes = []
+        func.interaction_routes.append((interaction_type, key, prefix))
+        return func
+    return deco
+
+
+class PrefixTrie(object):
+    """
+    Maps keys to values, looking up either the exact key or its longest registered prefix.
+    """
+
+    def __init__(self):
+        self.root = {}
+
+    def node(self, key, create=False):
+        node = self.root
+        for char in key:
+            if char not in node:
+                if not create:
+                    return None
+                node[char] = {}
+            node = node[char]
+        return node
+
+    def insert(self, key, value, prefix=False):
+        # Values live under keys that can't be characters, so they never clash with the children.
+        self.node(key, create=True)[prefix] = value
+
+    def remove(self, key, prefix=False):
+        node = self.node(key)
+        if node is not None:
+            node.pop(prefix, None)
+
+    def lookup(self, key):
+        node = self.root
+        match = node.get(True)
+        for char in key:
+            node = node.get(char)
+            if node is None:
+                return match
+            match = node.get(True, match)
+        return node.get(False, match)
+
+
+class InteractionRouter(object):
+    """
+    Routes every InteractionCreate to the single handler registered for it, so the gateway event is inspected once
+    instead of by a catch-all listener in every plugin. CorePlugin owns the one listener that feeds this.
+    """
+
+    def __init__(self):
+        # {interaction type: {command name: route}}
+        self.named = {}
+        # {interaction type: PrefixTrie of custom_id -> route}
+        self.custom_ids = {}
+        # {(interaction type, key): count} of interactions nothing was registered for.
+        self.unrouted = {}
+
+    def add(self, plugin, interaction_type, key, handler, prefix=False):
+        """
+        :param handler: Called with the event. None for interactions that are answered by a `wait_for_event`
+            elsewhere, so they aren't reported as unrouted.
+        """
+        entry = (plugin.name, handler)
+        if interaction_type in NAMED_TYPES:
+            self.named.setdefault(interaction_type, {})[key] = entry
+        else:
+            self.custom_ids.setdefault(interaction_type, PrefixTrie()).insert(key, entry, prefix)
+
+    def expect(self, plugin, interaction_type, key, prefix=False):
+        self.add(plugin, interaction_type, key, None, prefix)
+
+    def register(self, plugin):
+        """
+        Adds every method of the plugin decorated with `route`, replacing the routes of an earlier load.
+        """
+        self.unregister(plugin)
+
+        for name in dir(plugin.__class__):
+            func = getattr(plugin.__class__, name)
+            for interaction_type, key, prefix in getattr(func, 'interaction_routes', []):
+                self.add(plugin, interaction_type, key, getattr(plugin, name), prefix)
+
+    def unregister(self, plugin):
+        for routes in self.named.values():
+            for key in [key for key, (owner, _) in routes.items() if owner == plugin.name]:
+                del routes[key]
+
+        for trie in self.custom_ids.values():
+            stale = []
+            nodes = [('', trie.root)]
+            while nodes:
+                path, node = nodes.pop()
+                for key, value in node.items():
+                    if isinstance(key, bool):
+                        if value[0] == plugin.name:
+                            stale.append((path, key))
+                    else:
+                        nodes.append((path + key, value))
+            for path, prefix in stale:
+                trie.remove(path, prefix)
+
+    def resolve(self, interaction_type, key):
+        if interaction_type in NAMED_TYPES:
+            return self.named.get(interaction_type, {}).get(key)
+
+        trie = self.custom_ids.get(interaction_type)
+        return trie.lookup(key) if trie else None
+
+    def dispatch(self, event, log):
+        # TODO: Switch back to event.type after lib patch, same as the old listeners.
+        interaction_type = event.raw_data['interaction']['type']
+        if interaction_type in NAMED_TYPES:
+            key = event.data.name
+        elif interaction_type in (InteractionType.MESSAGE_COMPONENT, InteractionType.MODAL_SUBMIT):
+            key = event.data.custom_id
+        else:
+            return
+
+        entry = self.resolve(interaction_type, key)
+        if entry is None:
+            self.unrouted[(interaction_type, key)] = self.unrouted.get((interaction_type, key), 0) + 1
+            log.warning(f"[Interactions] No handler for interaction type {interaction_type} with key '{key}'.")
+            return
+
+        plugin_name, handler = entry
+        if handler:
+            with perf.timed('interaction', f"{plugin_name}.{handler.__name__}"):
+                return handler(event)
+
+
+# Shared by every plugin.
+interactions = InteractionRouter()
@@ -0,0 +1,197 @@
+from datetime import datetime, timedelta
+
+import gevent
+import requests
+from disco.api.http import APIException
+from gevent.event import Event
+from gevent.pool import Pool
+
+from PunyBot.models import OutboxMessage, OutboxStatus
+from PunyBot.utils.perf import perf
+
+# How often the outbox is checked for retries when nothing wakes it up.
+OUTBOX_POLL_INTERVAL = 15
+# How many routes (webhooks/channels) are delivered to at the same time.
+OUTBOX_CONCURRENCY = 4
+# Backoff for failed deliveries, doubled on every attempt up to the max.
+OUTBOX_BASE_BACKOFF = 5
+OUTBOX_MAX_BACKOFF = 900
+# After this many failed attempts a message is marked as failed and left alone.
+OUTBOX_MAX_ATTEMPTS = 8
+# Delivered/failed messages are kept around this long for debugging.
+OUTBOX_RETENTION = timedelta(days=1)
+
+# Discord's limits for a single message.
+MAX_EMBEDS = 10
+MAX_EMBED_CHARACTERS = 6000
+
+
+def embed_length(embed):
+    return (len(embed.get('title', '')) + len(embed.get('description', ''))
+            + len(embed.get('footer', {}).get('text', '')) + len(embed.get('author', {}).get('name', '')))
+
+
+class Outbox(object):
+    """
+    Durable queue for outbound messages. Pollers enqueue rendered payloads (ideally in the same transaction as
+    their cache update), and a worker greenlet drains them with one in-flight request per route.
+    """
+
+    def __init__(self, client, log):
+        self.client = client
+        self.log = log
+        self._wake = Event()
+        # Routes that got a 429, {route: datetime until it may be used again}
+        self.blocked_routes = {}
+
+    def enqueue_webhook(self, webhook, data):
+        """
+        :param webhook: The webhook in the "ID/TOKEN" format used by the config.
+        :param data: The webhook execute payload.
+        """
+        return OutboxMessage.create(route=f"webhook:{webhook}", payload=data)
+
+    def enqueue_channel(self, channel, **kwargs):
+        """
+        :param channel: The channel ID to post to.
+        :param kwargs: Keyword arguments passed on to channels_messages_create.
+        """
+        return OutboxMessage.create(route=f"channel:{channel}", payload=kwargs)
+
+    def wake(self):
+        self._wake.set()
+
+    def run(self):
+        while True:
+            self._wake.wait(timeout=OUTBOX_POLL_INTERVAL)
+            self._wake.clear()
+
+            try:
+                with perf.timed('schedule', "Outbox.drain"):
+                    self.drain()
+            except Exception:
+                self.log.exception("[Outbox] Failed to drain outbox:")
+
+    def drain(self):
+        now = datetime.now()
+
+        OutboxMessage.delete().where(
+            (OutboxMessage.status != OutboxStatus.PENDING) &
+            (OutboxMessage.created_at < now - OUTBOX_RETENTION)
+        ).execute()
+
+        pending = OutboxMessage.select().where(
+            (OutboxMessage.status == OutboxStatus.PENDING)
+        ).order_by(OutboxMessage.id.asc())
+
+        # Messages on a route go out in order, so a route stops at its first message that is still backing off.
+        routes = {}
+        waiting = set()
+        for message in pending:
+            if message.route in waiting:
+                continue
+            if message.next_attempt > now:
+                waiting.add(message.route)
+                continue
+            routes.setdefault(message.route, []).append(message)
+
+        pool = Pool(OUTBOX_CONCURRENCY)
+        for route, messages in routes.items():
+            if self.blocked_routes.get(route, now) > now:
+                continue
+            pool.spawn(self.deliver_route, route, messages)
+        pool.join()
+
+    def batches(self, route, messages):
+        # Channel messages go out one by one, so every article keeps its own link preview.
+        if not route.startswith("webhook:"):
+            return [[message] for message in messages]
+
+        # Embed-only webhook messages are merged into as few messages as Discord's embed limits allow.
+        batches = []
+        current = []
+        embeds = 0
+        characters = 0
+        for message in messages:
+            message_embeds = message.payload.get('embeds', [])
+            message_characters = sum(embed_length(embed) for embed in message_embeds)
+
+            if message.payload.get('content') or not message_embeds:
+                if current:
+                    batches.append(current)
+                batches.append([message])
+                current, embeds, characters = [], 0, 0
+                continue
+
+            if current and (embeds + len(message_embeds) > MAX_EMBEDS or characters + message_characters > MAX_EMBED_CHARACTERS):
+                batches.append(current)
+                current, embeds, characters = [], 0, 0
+
+            current.append(message)
+            embeds += len(message_embeds)
+            characters += message_characters
+
+        if current:
+            batches.append(current)
+        return batches
+
+    def send(self, route, messages):
+        kind, target = route.split(":", 1)
+
+        if kind == "webhook":
+            webhook, token = target.split("/")
+            if len(messages) == 1:
+                data = messages[0].payload
+            else:
+                data = {"content": "", "embeds": [embed for message in messages for embed in message.payload['embeds']]}
+            return self.client.api.webhooks_token_execute(webhook, token, data=data)
+
+        return self.client.api.channels_messages_create(int(target), **messages[0].payload)
+
+    def deliver_route(self, route, messages):
+        for batch in self.batches(route, messages):
+            ids = [message.id for message in batch]
+
+            try:
+                self.send(route, batch)
+            except APIException as e:
+                if e.response.status_code == 429:
+                    retry_after = 5
+                    try:
+                        retry_after = float(e.response.json().get('retry_after', retry_after))
+                    except ValueError:
+                        pass
+                    self.blocked_routes[route] = datetime.now() + timedelta(seconds=retry_after)
+                    self.log.warning(f"[Outbox] Rate limited on {route.split('/')[0]}, pausing for {retry_after}s.")
+                    gevent.spawn_later(retry_after, self.wake)
+                    return
+
+                # Anything else in the 4xx range won't get better by retrying.
+                permanent = 400 <= e.response.status_code < 500
+                self.failed(route, batch, f"API Error {e.code}, {e.msg}", permanent=permanent)
+                return
+            except requests.RequestException as e:
+                self.failed(route, batch, str(e))
+                return
+            except Exception as e:
+                # A payload that breaks the request itself fails the same way every time, retrying it would only
+                # hold up the route, so it's marked as failed right away.
+                self.failed(route, batch, f"{e.__class__.__name__}: {e}", permanent=True)
+                return
+
+            OutboxMessage.update(status=OutboxStatus.DELIVERED, delivered_at=datetime.now(),
+                                 attempts=OutboxMessage.attempts + 1).where(OutboxMessage.id.in_(ids)).execute()
+
+    def failed(self, route, messages, error, permanent=False):
+        # Only the route name is logged, webhook tokens stay out of the logs.
+        self.log.error(f"[Outbox] Failed to deliver {len(messages)} message(s) to {route.split('/')[0]}: {error}")
+
+        for message in messages:
+            message.attempts += 1
+            message.last_error = error
+            if permanent or message.attempts >= OUTBOX_MAX_ATTEMPTS:
+                message.status = OutboxStatus.FAILED
+            else:
+                backoff = min(OUTBOX_BASE_BACKOFF * (2 ** message.attempts), OUTBOX_MAX_BACKOFF)
+                message.next_attempt = datetime.now() + timedelta(seconds=backoff)
+            message.save()
@@ -0,0 +1,128 @@
+import contextlib
+import functools
+import time
+from bisect import bisect_left
+
+from disco.bot import Plugin
+
+# Upper bounds (in seconds) of the histogram buckets, 0.1ms to ~2 minutes growing by 25% each.
+BUCKET_BOUNDS = tuple(0.0001 * 1.25 ** i for i in range(64))
+
+
+class LatencyHistogram(object):
+    """
+    Latencies of one handler in fixed buckets, so percentiles cost the same memory no matter how often it ran.
+    Percentiles are the upper bound of their bucket, at most 25% above the real value.
+    """
+    __slots__ = ('buckets', 'count', 'errors', 'total', 'max')
+
+    def __init__(self):
+        # The last bucket holds everything slower than the last bound.
+        self.buckets = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds, error=False):
+        self.buckets[bisect_left(BUCKET_BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        if error:
+            self.errors += 1
+
+    def percentile(self, percent):
+        if not self.count:
+            return 0.0
+
+        rank = self.count * percent / 100
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= rank:
+                return min(BUCKET_BOUNDS[index], self.max) if index < len(BUCKET_BOUNDS) else self.max
+        return self.max
+
+
+class PerfRegistry(object):
+    """
+    Latency histograms of every listener, command, schedule and interaction handler, keyed by "kind:Plugin.name".
+    """
+
+    def __init__(self):
+        # {key: LatencyHistogram}
+        self.histograms = {}
+        self.started = time.time()
+
+    def record(self, kind, name, seconds, error=False):
+        key = f"{kind}:{name}"
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = LatencyHistogram()
+        histogram.record(seconds, error)
+
+    @contextlib.contextmanager
+    def timed(self, kind, name):
+        start = time.perf_counter()
+        error = False
+        try:
+            yield
+        except Exception:
+            error = True
+            raise
+        finally:
+            self.record(kind, name, time.perf_counter() - start, error)
+
+    def wrap(self, kind, name, func):
+        """
+        :return: `func`, recording every call under `kind` and `name`.
+        """
+        @functools.wraps(func)
+        def timed_func(*args, **kwargs):
+            with self.timed(kind, name):
+                return func(*args, **kwargs)
+
+        return timed_func
+
+    def report(self, limit=20):
+        """
+        :return: Lines of a table of the `limit` handlers with the highest p99, slowest first.
+        """
+        rows = sorted(self.histograms.items(), key=lambda item: item[1].percentile(99), reverse=True)[:limit]
+
+        width = max([len(key) for key, _ in rows] + [7])
+        lines = [f"{'Handler':<{width}} {'Count':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'Max':>8} {'Errors':>6}"]
+        for key, histogram in rows:
+            lines.append(f"{key:<{width}} {histogram.count:>7} "
+                         f"{format_seconds(histogram.percentile(50)):>8} {format_seconds(histogram.percentile(95)):>8} "
+                         f"{format_seconds(histogram.percentile(99)):>8} {format_seconds(histogram.max):>8} "
+                         f"{histogram.errors:>6}")
+        return lines
+
+
+def format_seconds(seconds):
+    if seconds < 1:
+        return f"{seconds * 1000:.1f}ms"
+    return f"{seconds:.2f}s"
+
+
+class TimedPlugin(Plugin):
+    """
+    Plugin recording how long each of its listeners, commands and schedules take in `perf`. Background work started
+    any other way (spawned greenlets, Eventual) has to be wrapped with `perf.wrap` itself.
+    """
+
+    def dispatch(self, typ, func, event, *args, **kwargs):
+        # Commands are dispatched as disco Command objects, listeners as the plain method.
+        name = f"!{func.name}" if typ == 'command' else func.__name__
+        with perf.timed(typ, f"{self.name}.{name}"):
+            return super(TimedPlugin, self).dispatch(typ, func, event, *args, **kwargs)
+
+    def register_schedule(self, func, interval, repeat=True, init=True, kwargs=None):
+        timed_func = perf.wrap('schedule', f"{self.name}.{func.__name__}", func)
+        return super(TimedPlugin, self).register_schedule(timed_func, interval, repeat, init, kwargs)
+
+
+# Shared by every plugin.
+perf = PerfRegistry()
@@ -0,0 +1,178 @@
+from collections import OrderedDict
+
+from disco.api.http import APIException
+
+# How many messages are remembered per channel, also how many are requested when a channel is backfilled.
+RECENT_MESSAGES_PER_CHANNEL = 100
+# How many channels are remembered, the least recently used one is dropped past this.
+RECENT_MESSAGE_CHANNELS = 250
+# Message content past this length isn't kept, it's only needed for labels and searching.
+SUMMARY_CONTENT_LENGTH = 300
+# Longest label Discord accepts for an autocomplete choice.
+CHOICE_NAME_LENGTH = 100
+
+
+class MessageSummary(object):
+    """
+    The parts of a message needed to offer it as an autocomplete choice.
+    """
+    __slots__ = ('id', 'author_id', 'author_name', 'content', 'filenames', 'search')
+
+    def __init__(self, id, author_id, author_name, content, filenames):
+        self.id = id
+        self.author_id = author_id
+        self.author_name = author_name
+        self.content = content
+        self.filenames = filenames
+        self.search = f"{author_name}\n{content}\n{filenames}".casefold()
+
+    @classmethod
+    def from_message(cls, message):
+        names = ", ".join(attachment.filename for attachment in message.attachments.values())
+        return cls(message.id, message.author.id, message.author.username,
+                   (message.content or "")[:SUMMARY_CONTENT_LENGTH], names)
+
+    def label(self, with_author=False):
+        text = self.content or self.filenames or "*NO CONTENT*"
+        if with_author:
+            text = f"{self.author_name}: {text}"
+
+        if len(text) > CHOICE_NAME_LENGTH:
+            text = f"{text[:CHOICE_NAME_LENGTH - 3]}..."
+        return text
+
+    def matches(self, query):
+        """
+        :param query: Already casefolded text typed by the user, matched against the content, filenames, author and ID.
+        """
+        return not query or query in self.search or str(self.id).startswith(query)
+
+
+class ChannelMessages(object):
+    def __init__(self):
+        # {message id: MessageSummary}, oldest first.
+        self.messages = OrderedDict()
+        # {author id: {message id: MessageSummary}}, oldest first.
+        self.authors = {}
+        # Whether older messages were requested from the API yet, messages seen on the gateway don't count.
+        self.backfilled = False
+
+    def add(self, summary):
+        if summary.id in self.messages:
+            return self.replace(summary)
+
+        self.messages[summary.id] = summary
+        self.authors.setdefault(summary.author_id, OrderedDict())[summary.id] = summary
+
+        # Messages arrive in order, backfilled ones are the exception and get sorted in `merge`.
+        while len(self.messages) > RECENT_MESSAGES_PER_CHANNEL:
+            self.remove(next(iter(self.messages)))
+
+    def replace(self, summary):
+        self.messages[summary.id] = summary
+        self.authors[summary.author_id][summary.id] = summary
+
+    def remove(self, message_id):
+        summary = self.messages.pop(message_id, None)
+        if not summary:
+            return
+
+        authored = self.authors[summary.author_id]
+        del authored[message_id]
+        if not authored:
+            del self.authors[summary.author_id]
+
+    def merge(self, summaries):
+        for summary in summaries:
+            if summary.id not in self.messages:
+                self.messages[summary.id] = summary
+
+        self.messages = OrderedDict(sorted(self.messages.items())[-RECENT_MESSAGES_PER_CHANNEL:])
+        self.authors = {}
+        for message_id, summary in self.messages.items():
+            self.authors.setdefault(summary.author_id, OrderedDict())[message_id] = summary
+
+    def newest(self, author_id=None):
+        messages = self.messages if author_id is None else self.authors.get(author_id, {})
+        return reversed(messages.values())
+
+
+class RecentMessages(object):
+    """
+    Summaries of the latest messages in each channel, kept up to date from gateway events so autocomplete doesn't
+    have to ask the API on every keystroke. A channel is only requested from the API the first time it is searched.
+    """
+
+    def __init__(self):
+        # {channel id: ChannelMessages}, least recently used first.
+        self.channels = OrderedDict()
+
+    def channel(self, channel_id, create=True):
+        channel = self.channels.get(channel_id)
+        if channel is not None:
+            self.channels.move_to_end(channel_id)
+            return channel
+
+        if not create:
+            return None
+
+        channel = self.channels[channel_id] = ChannelMessages()
+        if len(self.channels) > RECENT_MESSAGE_CHANNELS:
+            self.channels.popitem(last=False)
+        return channel
+
+    def add(self, message):
+        self.channel(message.channel_id).add(MessageSummary.from_message(message))
+
+    def update(self, message):
+        channel = self.channel(message.channel_id, create=False)
+        # Edits without content (embeds resolving) don't change the summary.
+        if channel is None or message.id not in channel.messages or message.content is None:
+            return
+
+        summary = channel.messages[message.id]
+        channel.replace(MessageSummary(summary.id, summary.author_id, summary.author_name,
+                                       message.content[:SUMMARY_CONTENT_LENGTH], summary.filenames))
+
+    def delete(self, channel_id, message_ids):
+        channel = self.channel(channel_id, create=False)
+        if channel is None:
+            return
+
+        for message_id in message_ids:
+            channel.remove(message_id)
+
+    def backfill(self, client, channel_id, log):
+        channel = self.channel(channel_id)
+        if channel.backfilled:
+            return
+
+        # Marked first, so keystrokes arriving while this request runs don't request the channel again.
+        channel.backfilled = True
+        try:
+            messages = client.api.channels_messages_list(channel_id, limit=RECENT_MESSAGES_PER_CHANNEL)
+        except APIException as e:
+            channel.backfilled = False
+            log.warning(f"[Recent Messages] Unable to backfill channel {channel_id}: {e}")
+            return
+
+        channel.merge(MessageSummary.from_message(message) for message in messages)
+
+    def search(self, client, channel_id, log, query="", author_id=None, limit=25):
+        """
+        :return: Up to `limit` MessageSummary objects matching the typed `query`, newest first.
+        """
+        self.backfill(client, channel_id, log)
+
+        query = (query or "").strip().casefold()
+        results = []
+        for summary in self.channel(channel_id).newest(author_id):
+            if summary.matches(query):
+                results.append(summary)
+                if len(results) == limit:
+                    break
+        return results
+
+
+# Shared by every plugin, CorePlugin feeds it from the gateway.
+recent_messages = RecentMessages()
@@ -0,0 +1,74 @@
+import gevent
+from disco.api.http import APIException
+
+# Menu submissions from the same member within this many seconds are combined into one update.
+ROLE_DEBOUNCE = 2
+# Updates changing up to this many roles use the add/remove role routes, larger ones a single member PATCH.
+ROLE_MAX_SINGLE_CALLS = 2
+
+
+class RoleAssigner(object):
+    """
+    Applies role menu selections. Submissions are acknowledged right away and only the last one a member makes within
+    `ROLE_DEBOUNCE` seconds is applied, as the difference to the member's cached roles, so a member clicking through
+    the menu costs one update instead of a PATCH per click.
+    """
+
+    def __init__(self, client, log):
+        self.client = client
+        self.log = log
+        # {(guild id, member id): (menu role ids, selected role ids)} waiting to be applied.
+        self.pending = {}
+        # {(guild id, member id): Greenlet} applying the pending selection once the debounce passes.
+        self.timers = {}
+
+    def select(self, guild_id, member_id, menu_roles, selected):
+        """
+        :param menu_roles: Every role the menu offers, roles outside of it are never touched.
+        :param selected: The roles picked in the menu.
+        """
+        key = (guild_id, member_id)
+        self.pending[key] = (frozenset(menu_roles), frozenset(selected) & frozenset(menu_roles))
+
+        if key not in self.timers:
+            self.timers[key] = gevent.spawn_later(ROLE_DEBOUNCE, self.flush, key)
+
+    def diff(self, current, menu_roles, selected):
+        """
+        :return: (roles to add, roles to remove)
+        """
+        return selected - current, (menu_roles - selected) & current
+
+    def flush(self, key):
+        del self.timers[key]
+        menu_roles, selected = self.pending.pop(key)
+        guild_id, member_id = key
+
+        guild = self.client.state.guilds.get(guild_id)
+        member = guild.get_member(member_id) if guild else None
+        if not member:
+            self.log.warning(f"[Role Menu] Member {member_id} not found in guild {guild_id}, skipping role update.")
+            return
+
+        current = set(member.roles)
+        add, remove = self.diff(current, menu_roles, selected)
+        if not add and not remove:
+            return
+
+        try:
+            if len(add) + len(remove) <= ROLE_MAX_SINGLE_CALLS:
+                for role_id in add:
+                    self.client.api.guilds_members_roles_add(guild_id, member_id, role_id,
+                                                             reason="Updating selected roles from menu")
+                for role_id in remove:
+                    self.client.api.guilds_members_roles_remove(guild_id, member_id, role_id,
+                                                                reason="Updating selected roles from menu")
+            else:
+                self.client.api.guilds_members_modify(guild_id, member_id, roles=list((current - remove) | add),
+                                                      reason="Updating selected roles from menu")
+        except APIException as e:
+            self.log.error(f"[Role Menu] Unable to update roles of member {member_id} in guild {guild_id}: {e}")
+            return
+
+        # The gateway confirms this later, a selection made before that is diffed against the new roles already.
+        member.roles = list((current - remove) | add)
@@ -0,0 +1,109 @@
+import heapq
+import statistics
+import time
+
+# How many publish times are kept per source to estimate its cadence.
+HISTORY_SIZE = 10
+# A source is polled this many times per expected publish.
+POLLS_PER_PUBLISH = 4
+# Interval multipliers after a poll with/without new items.
+SPEED_UP = 0.5
+BACK_OFF = 1.5
+
+
+class AdaptiveScheduler(object):
+    """
+    Priority queue of polling sources, each with its own interval. A source's interval shrinks when it has new items,
+    grows while it stays quiet, and is pulled towards its publish cadence, always staying between floor and ceiling.
+    """
+
+    def __init__(self, floor, ceiling):
+        self.floor = floor
+        self.ceiling = ceiling
+        self.intervals = {}
+        self.history = {}
+        self._queue = []
+        # {key: due time}, heap entries not matching this are stale and skipped.
+        self._due = {}
+
+    def clamp(self, interval):
+        return min(max(interval, self.floor), self.ceiling)
+
+    def schedule(self, key, delay):
+        due = time.time() + delay
+        self._due[key] = due
+        heapq.heappush(self._queue, (due, key))
+
+    def add(self, key, interval, delay=0):
+        """
+        :param key: Any hashable identifying the source.
+        :param interval: The starting interval in seconds, before anything has been learned.
+        :param delay: Seconds until the first poll.
+        """
+        self.intervals[key] = self.clamp(interval)
+        self.schedule(key, delay)
+
+    def remove(self, key):
+        self.intervals.pop(key, None)
+        self.history.pop(key, None)
+        self._due.pop(key, None)
+
+    def is_scheduled(self, key):
+        return key in self._due
+
+    def due(self):
+        """
+        :return: Every source that should be polled now. They are out of the queue until `record` is called.
+        """
+        now = time.time()
+        keys = []
+        while self._queue and self._queue[0][0] <= now:
+            due, key = heapq.heappop(self._queue)
+            if self._due.get(key) != due:
+                continue
+            del self._due[key]
+            keys.append(key)
+        return keys
+
+    def seconds_until_next(self):
+        while self._queue and self._due.get(self._queue[0][1]) != self._queue[0][0]:
+            heapq.heappop(self._queue)
+
+        if not self._queue:
+            return None
+        return max(self._queue[0][0] - time.time(), 0)
+
+    def cadence(self, key):
+        """
+        :return: Median seconds between publishes, counting the time since the latest one. None if unknown.
+        """
+        timestamps = self.history.get(key)
+        if not timestamps:
+            return None
+
+        gaps = [later - earlier for earlier, later in zip(timestamps, timestamps[1:])]
+        gaps.append(max(time.time() - timestamps[-1], 0))
+        return statistics.median(gaps)
+
+    def record(self, key, timestamps=None, new_items=0):
+        """
+        Feeds a poll's result back in and puts the source back in the queue.
+
+        :param key: The source that was polled.
+        :param timestamps: Publish times of the items the source returned, None if the poll had nothing to go on.
+        :param new_items: How many of those items hadn't been seen before.
+        """
+        if key not in self.intervals:
+            return
+
+        if timestamps:
+            self.history[key] = sorted(timestamps)[-HISTORY_SIZE:]
+
+        interval = self.intervals[key] * (SPEED_UP if new_items else BACK_OFF)
+
+        cadence = self.cadence(key)
+        if cadence is not None:
+            interval = (interval + cadence / POLLS_PER_PUBLISH) / 2
+
+        self.intervals[key] = self.clamp(interval)
+        self.schedule(key, self.intervals[key])
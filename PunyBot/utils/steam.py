@@ -0,0 +1,135 @@
+from datetime import datetime, timedelta
+
+import requests
+from gevent.event import Event
+from gevent.pool import Pool
+
+from PunyBot.models import SteamAppCache
+from PunyBot.utils.http import http
+from PunyBot.utils.perf import perf
+
+# How long an app's name/header image are trusted before being refreshed.
+APP_METADATA_TTL = timedelta(days=7)
+# Apps the store didn't return are retried sooner, in case it was a temporary problem.
+APP_METADATA_MISSING_TTL = timedelta(hours=6)
+# How often the refresher checks for stale apps when nothing wakes it up.
+APP_METADATA_CHECK_INTERVAL = 3600
+# How many apps are requested from the store at the same time.
+APP_METADATA_CONCURRENCY = 4
+# (connect, read) timeouts for a single appdetails request.
+APP_METADATA_TIMEOUT = (5, 15)
+
+
+class SteamAppMetadata(object):
+    """
+    Names and header images of Steam apps, kept in the steam_app_cache table and in memory. Lookups never make
+    requests, plugins `track` the apps they need and a single background refresher keeps those up to date.
+    """
+
+    def __init__(self):
+        # {app_id: SteamAppCache}
+        self.apps = {}
+        self.tracked = set()
+        self.loaded = False
+        self._wake = Event()
+
+    def load(self):
+        if self.loaded:
+            return
+
+        for row in SteamAppCache.select():
+            self.apps[row.app] = row
+        self.loaded = True
+
+    def track(self, app_ids):
+        """
+        Adds apps to the set kept up to date, waking the refresher if any of them needs fetching.
+        """
+        self.load()
+        app_ids = {int(app_id) for app_id in app_ids}
+        self.tracked.update(app_ids)
+
+        if any(self.is_stale(app_id) for app_id in app_ids):
+            self._wake.set()
+
+    def get(self, app_id):
+        self.load()
+        return self.apps.get(int(app_id))
+
+    def name(self, app_id, default=None):
+        app = self.get(app_id)
+        return app.name if app and app.name else default
+
+    def header_image(self, app_id, default=None):
+        app = self.get(app_id)
+        return app.header_image if app and app.header_image else default
+
+    def is_stale(self, app_id):
+        app = self.apps.get(app_id)
+        if not app:
+            return True
+
+        ttl = APP_METADATA_TTL if app.name else APP_METADATA_MISSING_TTL
+        return app.updated_at < datetime.now() - ttl
+
+    def fetch(self, app_id, log):
+        """
+        :return: (name, header_image), both None if the store doesn't have the app. None if the request failed.
+        """
+        try:
+            r = http.get("https://store.steampowered.com/api/appdetails",
+                         params={'appids': app_id, 'filters': 'basic'}, timeout=APP_METADATA_TIMEOUT)
+            r.raise_for_status()
+            details = r.json()[str(app_id)]
+            if not details['success']:
+                log.warning(f"[Steam Apps] APP ID {app_id} not found on the steam store.")
+                return None, None
+            return details['data']['name'], details['data'].get('header_image')
+        except (requests.RequestException, ValueError, KeyError, TypeError) as e:
+            log.error(f"[Steam Apps] Unable to get app details for APP ID {app_id}: {e}")
+            return None
+
+    def refresh(self, log, force=False):
+        """
+        Fetches every tracked app that is stale (or all of them when forced), concurrently.
+        """
+        app_ids = [app_id for app_id in self.tracked if force or self.is_stale(app_id)]
+        if not app_ids:
+            return
+
+        pool = Pool(APP_METADATA_CONCURRENCY)
+        fetches = {app_id: pool.spawn(self.fetch, app_id, log) for app_id in app_ids}
+        pool.join()
+
+        rows = []
+        for app_id, job in fetches.items():
+            # Failed requests keep the old row, and are retried on the next check.
+            if not job.value:
+                continue
+
+            name, header_image = job.value
+            rows.append({'app': app_id, 'name': name, 'header_image': header_image, 'updated_at': datetime.now()})
+
+        if rows:
+            SteamAppCache.insert_many(rows).on_conflict_replace().execute()
+            for row in rows:
+                self.apps[row['app']] = SteamAppCache(**row)
+
+        log.info(f"[Steam Apps] Refreshed {len(rows)}/{len(app_ids)} app(s).")
+
+    def run(self, log):
+        self.load()
+
+        while True:
+            try:
+                with perf.timed('schedule', "SteamAppMetadata.refresh"):
+                    self.refresh(log)
+            except Exception:
+                log.exception("[Steam Apps] Failed to refresh app details:")
+
+            self._wake.wait(timeout=APP_METADATA_CHECK_INTERVAL)
+            self._wake.clear()
+
+
+# Shared by every plugin, CorePlugin runs the refresher.
+steam_apps = SteamAppMetadata()
@@ -0,0 +1,169 @@
+import functools
+import inspect
+import os
+import re
+import string
+
+import yaml
+
+# A placeholder's field: a name, optionally followed by .attribute or [key] lookups.
+FIELD_PATTERN = re.compile(r"(?P<root>[A-Za-z_]\w*)(?:\.\w+|\[[^\[\]]+\])*")
+# Conversions str.format accepts after a "!".
+FIELD_CONVERSIONS = (None, 's', 'r', 'a')
+
+
+class TemplateError(Exception):
+    pass
+
+
+def template(func):
+    """
+    Turns a method of MessageTemplates into the render function of the template with the same name. The method's
+    keyword only arguments are the fields the template may use, a template using anything else fails to load.
+    """
+    fields = frozenset(name for name, parameter in inspect.signature(func).parameters.items()
+                       if parameter.kind == parameter.KEYWORD_ONLY)
+
+    @functools.wraps(func)
+    def render(self, **kwargs):
+        # Calling the empty method checks the arguments against its signature.
+        func(self, **kwargs)
+        return self.texts[func.__name__].format_map(kwargs)
+
+    render.fields = fields
+    return render
+
+
+def parse_template(name, text, allowed):
+    """
+    :return: The root names of the fields `text` uses, e.g. "ticket" for "{ticket.id}".
+    """
+    try:
+        parsed = list(string.Formatter().parse(text))
+    except ValueError as e:
+        raise TemplateError(f"{name}: {e}")
+
+    used = set()
+    for _, field, format_spec, conversion in parsed:
+        if field is None:
+            continue
+
+        match = FIELD_PATTERN.fullmatch(field)
+        if not match:
+            raise TemplateError(f"{name}: placeholders need a field name, got {{{field}}}")
+        if match.group('root') not in allowed:
+            raise TemplateError(f"{name}: unknown field {{{field}}}, expected one of: {', '.join(sorted(allowed))}")
+        if conversion not in FIELD_CONVERSIONS:
+            raise TemplateError(f"{name}: unknown conversion !{conversion} in {{{field}}}")
+        if '{' in format_spec:
+            raise TemplateError(f"{name}: nested placeholders aren't supported in {{{field}}}")
+        used.add(match.group('root'))
+    return used
+
+
+class MessageTemplates(object):
+    """
+    The message templates of config/message_templates.yaml. Templates with fields are rendered through their method
+    below and checked when the file is loaded, so a typo in a placeholder fails at startup (or keeps the previous
+    templates on reload) instead of when the message is sent. Plain templates are read as attributes, exactly as
+    written.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.mtime = None
+        # {template name: text}
+        self.texts = {}
+        self.load()
+
+    @classmethod
+    def render_functions(cls):
+        return {name: value for name, value in inspect.getmembers(cls) if hasattr(value, 'fields')}
+
+    def read(self):
+        # Taken before reading, so a write during the read is picked up by the next reload.
+        mtime = os.stat(self.path).st_mtime_ns
+        with open(self.path, 'r', encoding='utf-8') as f:
+            data = yaml.safe_load(f)
+
+        if not isinstance(data, dict):
+            raise TemplateError("expected a mapping of template names to text")
+
+        functions = self.render_functions()
+        missing = sorted(set(functions) - set(data))
+        if missing:
+            raise TemplateError(f"missing template(s): {', '.join(missing)}")
+
+        texts = {}
+        for name, text in data.items():
+            if not isinstance(text, str):
+                raise TemplateError(f"{name}: expected text, got {type(text).__name__}")
+
+            # Plain templates are sent as written, braces and all. Only templates with fields go through format.
+            if name in functions:
+                parse_template(name, text, functions[name].fields)
+            texts[name] = text
+        return mtime, texts
+
+    def load(self):
+        self.mtime, self.texts = self.read()
+
+    def reload(self, log):
+        """
+        Loads the file again if it changed since the last load. A file that doesn't load keeps the current templates.
+
+        :return: Whether the templates were replaced.
+        """
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError as e:
+            log.warning(f"[Templates] Unable to check {self.path} for changes: {e}")
+            return False
+
+        if mtime == self.mtime:
+            return False
+
+        try:
+            self.load()
+        except (OSError, yaml.YAMLError, TemplateError) as e:
+            # Not tried again until the file changes again.
+            self.mtime = mtime
+            log.error(f"[Templates] Keeping the previous templates, {self.path} is invalid: {e}")
+            return False
+
+        log.info(f"[Templates] Reloaded {len(self.texts)} template(s) from {self.path}.")
+        return True
+
+    def __getattr__(self, name):
+        texts = self.__dict__.get('texts', {})
+        if name not in texts:
+            raise AttributeError(f"No message template named {name!r}")
+        return texts[name]
+
+    @template
+    def rss_news_message(self, *, title, url, author, timestamp):
+        pass
+
+    @template
+    def pickup_chat_channel_message_base(self, *, host_id, game_region, server_info, expire_timestamp, action_time):
+        pass
+
+    @template
+    def pickup_chat_server_information(self, *, server_name, server_password):
+        pass
+
+    @template
+    def pickup_pregame_confirm_server_info(self, *, region, server_name, server_password):
+        pass
+
+    @template
+    def support_new_temp_channel_no_dm(self, *, ticket):
+        pass
+
+    @template
+    def support_new_temp_channel_user(self, *, ticket, channel_id):
+        pass
+
+    @template
+    def support_ticket_close_user(self, *, ticket, close_reason):
+        pass
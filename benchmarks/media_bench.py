@@ -0,0 +1,420 @@
+"""
+Offline benchmark for the media pipeline.
+
+Serves synthetic RSS/Atom feeds and Steam GetNewsForApp responses from a local HTTP server, loads MediaPlugin against
+a fake Discord API and drives check_rss/get_steam_news (plus outbox delivery) for a number of cycles. Every cycle the
+server publishes new items, so each one measures a realistic poll: download, parse, dedupe, queue and deliver.
+
+Reported per cycle and source: wall time of the poll and of the delivery, CPU time, feed parse CPU and posts per
+second. One extra cycle runs under tracemalloc to report peak and retained allocations.
+
+The bot's own config and database are never touched, everything runs in a throwaway working directory.
+
+Run from the repository root:
+    python -m benchmarks.media_bench --feeds 50 --steam-apps 20 --cycles 5
+"""
+from gevent import monkey
+
+monkey.patch_all()
+
+import argparse
+import json
+import logging
+import os
+import resource
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from email.utils import formatdate
+from types import SimpleNamespace
+from urllib.parse import parse_qs
+
+import gevent
+import yaml
+from gevent.pywsgi import WSGIServer
+from requests.adapters import HTTPAdapter
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+STEAM_API = "https://api.steampowered.com"
+# Words the synthetic item bodies are built from.
+FILLER = "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor incididunt ut labore "
+
+
+class SyntheticSource(object):
+    """
+    Generates the documents served for every feed/app. Each call to `publish` adds `new_per_cycle` items to every
+    source, with timestamps that keep increasing so they always count as new.
+    """
+
+    def __init__(self, items, new_per_cycle, item_size):
+        self.items = items
+        self.new_per_cycle = new_per_cycle
+        self.filler = (FILLER * (item_size // len(FILLER) + 1))[:item_size]
+        self.generation = 0
+        self.epoch = int(time.time()) - items
+        self._documents = {}
+
+    def publish(self):
+        self.generation += 1
+        self._documents.clear()
+
+    @property
+    def etag(self):
+        # Changes only when something was published, so conditional requests get a 304 otherwise.
+        return f'"{self.items + self.generation * self.new_per_cycle}"'
+
+    def item_numbers(self, count):
+        newest = self.items + self.generation * self.new_per_cycle
+        return range(newest, max(newest - count, 0), -1)
+
+    def timestamp(self, number):
+        return self.epoch + number
+
+    def rss(self, index):
+        items = "".join(
+            f"<item><title>Feed {index} item {n}</title><link>http://bench.invalid/rss/{index}/{n}</link>"
+            f"<guid>bench-rss-{index}-{n}</guid><pubDate>{formatdate(self.timestamp(n), usegmt=True)}</pubDate>"
+            f"<author>bench@bench.invalid (Bench Author)</author><description>{self.filler}</description></item>"
+            for n in self.item_numbers(self.items))
+        return (f'<?xml version="1.0" encoding="utf-8"?><rss version="2.0"><channel><title>Feed {index}</title>'
+                f'<link>http://bench.invalid/rss/{index}</link><description>Synthetic feed</description>{items}'
+                f'</channel></rss>')
+
+    def atom(self, index):
+        entries = "".join(
+            f'<entry><title>Feed {index} entry {n}</title><link href="http://bench.invalid/atom/{index}/{n}"/>'
+            f'<id>bench-atom-{index}-{n}</id><published>{time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(self.timestamp(n)))}'
+            f'</published><author><name>Bench Author</name></author><summary>{self.filler}</summary></entry>'
+            for n in self.item_numbers(self.items))
+        return (f'<?xml version="1.0" encoding="utf-8"?><feed xmlns="http://www.w3.org/2005/Atom">'
+                f'<title>Feed {index}</title><id>bench-atom-{index}</id>{entries}</feed>')
+
+    def steam(self, app_id, count):
+        news_items = [{
+            "gid": str(n),
+            "title": f"App {app_id} news {n}",
+            "url": f"http://bench.invalid/steam/{app_id}/{n}",
+            "is_external_url": True,
+            "author": "Bench Author",
+            "contents": self.filler[:400],
+            "feedlabel": "Community Announcements",
+            "date": self.timestamp(n),
+            "feedname": "steam_community_announcements",
+        } for n in self.item_numbers(count)]
+        return json.dumps({"appnews": {"appid": int(app_id), "newsitems": news_items, "count": len(news_items)}})
+
+    def document(self, key, render):
+        # Rendered once per generation, so serving costs as little as possible of the measured CPU.
+        if key not in self._documents:
+            self._documents[key] = render().encode()
+        return self._documents[key]
+
+
+class FeedServer(object):
+    """
+    Local stand-in for the feed publishers and the Steam Web API.
+    """
+
+    def __init__(self, source, latency):
+        self.source = source
+        self.latency = latency
+        self.requests = 0
+        self.server = WSGIServer(('127.0.0.1', 0), self.app, log=None)
+
+    def start(self):
+        self.server.start()
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+    def stop(self):
+        self.server.stop()
+
+    def app(self, environ, start_response):
+        self.requests += 1
+        if self.latency:
+            gevent.sleep(self.latency)
+
+        path = environ['PATH_INFO'].strip("/").split("/")
+
+        if environ.get('HTTP_IF_NONE_MATCH') == self.source.etag:
+            start_response("304 Not Modified", [('ETag', self.source.etag)])
+            return [b""]
+
+        if path[0] == "rss":
+            body = self.source.document(('rss', path[1]), lambda: self.source.rss(path[1]))
+            content_type = "application/rss+xml"
+        elif path[0] == "atom":
+            body = self.source.document(('atom', path[1]), lambda: self.source.atom(path[1]))
+            content_type = "application/atom+xml"
+        elif path[0] == "ISteamNews":
+            query = parse_qs(environ.get('QUERY_STRING', ''))
+            app_id = query['appid'][0]
+            count = int(query.get('count', ['20'])[0])
+            body = self.source.document(('steam', app_id, count), lambda: self.source.steam(app_id, count))
+            content_type = "application/json"
+        else:
+            start_response("404 Not Found", [])
+            return [b""]
+
+        start_response("200 OK", [('Content-Type', content_type), ('Content-Length', str(len(body))),
+                                  ('ETag', self.source.etag)])
+        return [body]
+
+
+class LocalSteamAdapter(HTTPAdapter):
+    """
+    Sends requests meant for the Steam Web API to the local server instead.
+    """
+
+    def __init__(self, base_url, **kwargs):
+        self.base_url = base_url
+        super(LocalSteamAdapter, self).__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        request.url = self.base_url + request.url[len(STEAM_API):]
+        return super(LocalSteamAdapter, self).send(request, **kwargs)
+
+
+class FakeDiscordAPI(object):
+    """
+    Accepts everything the outbox sends, counting API calls and the posts they carried.
+    """
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+        self.posts = 0
+
+    def respond(self, posts):
+        if self.latency:
+            gevent.sleep(self.latency)
+        self.calls += 1
+        self.posts += posts
+
+    def webhooks_token_execute(self, webhook, token, data):
+        self.respond(max(len(data.get('embeds', [])), 1))
+
+    def channels_messages_create(self, channel, **kwargs):
+        self.respond(1)
+
+
+def cpu_time(include_children):
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN) if include_children else None
+    children = usage.ru_utime + usage.ru_stime if usage else 0
+    return time.process_time() + children
+
+
+class ParseTimer(object):
+    """
+    Adds up the CPU spent in feedparser and entry normalization. Parsing never yields, so nothing else runs while
+    a single parse is being timed.
+    """
+
+    def __init__(self):
+        self.total = 0
+
+    def wrap(self, func):
+        def timed(*args, **kwargs):
+            start = time.process_time()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.total += time.process_time() - start
+        return timed
+
+
+def prepare_workdir(args, base_url):
+    workdir = tempfile.mkdtemp(prefix="punybot-bench-")
+    os.makedirs(os.path.join(workdir, "data"))
+    os.makedirs(os.path.join(workdir, "config"))
+
+    for name in ("message_templates.yaml", "interactions.yaml"):
+        shutil.copy(os.path.join(REPO_ROOT, "config", name), os.path.join(workdir, "config", name))
+
+    feed_urls = []
+    for index in range(args.feeds):
+        kind = args.format if args.format != "mixed" else ("rss", "atom")[index % 2]
+        feed_urls.append(f"{base_url}/{kind}/{index}")
+
+    config = {
+        'media': {
+            'steam': {'Bench': {'url': "1/bench-token", 'apps': [str(100000 + index) for index in range(args.steam_apps)]}},
+            'rss': {1000 + (index % args.channels): [] for index in range(args.channels)},
+            'rss_worker_process': args.worker_process,
+        }
+    }
+    for index, feed_url in enumerate(feed_urls):
+        config['media']['rss'][1000 + (index % args.channels)].append(feed_url)
+
+    with open(os.path.join(workdir, "config", "config.yaml"), 'w') as f:
+        yaml.safe_dump(config, f)
+
+    return workdir
+
+
+def load_plugin(api, base_url):
+    # Only importable once the working directory (config and database) is in place.
+    from disco.util.emitter import Emitter
+    from disco.util.threadlocal import ThreadLocal
+    from PunyBot.plugins.media import MediaPlugin
+    from PunyBot.utils.http import http, POOL_CONNECTIONS_PER_HOST
+
+    client = SimpleNamespace(api=api, state=None, events=Emitter(), packets=Emitter())
+    bot = SimpleNamespace(client=client, ctx=ThreadLocal(), storage=None)
+
+    plugin = MediaPlugin(bot, None)
+    plugin.load({})
+    # The benchmark drives the polls and the outbox itself.
+    gevent.killall(list(plugin.greenlets))
+
+    http.session.mount(STEAM_API + "/", LocalSteamAdapter(base_url, pool_maxsize=POOL_CONNECTIONS_PER_HOST))
+
+    return plugin
+
+
+def run_stage(plugin, api, poll, parse_timer, worker_process):
+    calls, posts = api.calls, api.posts
+    parse_before = parse_timer.total if parse_timer else 0
+    cpu_before = cpu_time(worker_process)
+
+    start = time.perf_counter()
+    poll()
+    polled = time.perf_counter()
+    plugin.outbox.drain()
+    delivered = time.perf_counter()
+
+    cpu = cpu_time(worker_process) - cpu_before
+    posts = api.posts - posts
+    return {
+        'poll_ms': (polled - start) * 1000,
+        'deliver_ms': (delivered - polled) * 1000,
+        'cpu_ms': cpu * 1000,
+        # Only feeds parsed in this process are timed, the worker's time shows up in cpu_ms.
+        'parse_cpu_ms': (parse_timer.total - parse_before) * 1000 if parse_timer and not worker_process else None,
+        'posts': posts,
+        'api_calls': api.calls - calls,
+        'posts_per_sec': posts / (delivered - start) if delivered > start else 0,
+    }
+
+
+def run_cycle(plugin, api, source, parse_timer, args):
+    source.publish()
+    results = {}
+    if args.feeds:
+        results['rss'] = run_stage(plugin, api, plugin.check_rss, parse_timer, args.worker_process)
+    if args.steam_apps:
+        results['steam'] = run_stage(plugin, api, plugin.get_steam_news, None, False)
+    return results
+
+
+def format_ms(value):
+    return f"{value:9.1f}" if value is not None else "        -"
+
+
+def print_report(cycles, allocations, args):
+    print(f"feeds={args.feeds} ({args.format}) steam_apps={args.steam_apps} items={args.items} "
+          f"new_per_cycle={args.new_per_cycle} item_size={args.item_size} server_latency={args.latency}s "
+          f"discord_latency={args.discord_latency}s worker_process={args.worker_process}")
+    print()
+    print("cycle  source    poll ms  deliver ms    cpu ms  parse ms  posts  api calls  posts/s")
+    for number, cycle in enumerate(cycles):
+        label = "cold" if number == 0 else str(number)
+        for name, stage in cycle.items():
+            print(f"{label:>5}  {name:<6} {format_ms(stage['poll_ms'])}   {format_ms(stage['deliver_ms'])} "
+                  f"{format_ms(stage['cpu_ms'])} {format_ms(stage['parse_cpu_ms'])} {stage['posts']:6d} "
+                  f"{stage['api_calls']:10d} {stage['posts_per_sec']:8.1f}")
+
+    warm = cycles[1:]
+    if warm:
+        print()
+        print("median over warm cycles:")
+        for name in warm[0]:
+            stages = [cycle[name] for cycle in warm]
+            summary = ", ".join(
+                f"{key} {statistics.median(stage[key] for stage in stages):.1f}"
+                for key in ('poll_ms', 'deliver_ms', 'cpu_ms', 'parse_cpu_ms', 'posts_per_sec')
+                if stages[0][key] is not None)
+            print(f"  {name}: {summary}")
+
+    if allocations:
+        print()
+        print(f"allocations (one traced cycle): peak {allocations['peak_kib']:.1f} KiB, "
+              f"retained {allocations['retained_kib']:.1f} KiB")
+
+
+def parse_args():
+    arg_parser = argparse.ArgumentParser(description="Offline benchmark for MediaPlugin's RSS and Steam news polling.")
+    arg_parser.add_argument("--feeds", type=int, default=20, help="Number of RSS/Atom feeds.")
+    arg_parser.add_argument("--format", choices=("rss", "atom", "mixed"), default="mixed", help="Feed format.")
+    arg_parser.add_argument("--channels", type=int, default=2, help="Channels the feeds are spread over.")
+    arg_parser.add_argument("--steam-apps", type=int, default=10, help="Number of Steam apps.")
+    arg_parser.add_argument("--items", type=int, default=50, help="Items in every feed.")
+    arg_parser.add_argument("--new-per-cycle", type=int, default=2, help="Items published per source every cycle.")
+    arg_parser.add_argument("--item-size", type=int, default=500, help="Characters in every item's body.")
+    arg_parser.add_argument("--latency", type=float, default=0.0, help="Seconds the server waits before responding.")
+    arg_parser.add_argument("--discord-latency", type=float, default=0.0, help="Seconds every fake Discord call takes.")
+    arg_parser.add_argument("--cycles", type=int, default=5, help="Cycles to run after the cold one.")
+    arg_parser.add_argument("--worker-process", action="store_true", help="Fetch and parse RSS in a worker process.")
+    arg_parser.add_argument("--no-allocations", action="store_true", help="Skip the tracemalloc cycle.")
+    arg_parser.add_argument("--json", metavar="PATH", help="Also write the raw results to this file.")
+    arg_parser.add_argument("--keep-workdir", action="store_true", help="Keep the temporary config/database around.")
+    args = arg_parser.parse_args()
+    args.channels = max(args.channels, 1)
+    return args
+
+
+def main():
+    args = parse_args()
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s %(name)s: %(message)s")
+
+    source = SyntheticSource(args.items, args.new_per_cycle, args.item_size)
+    server = FeedServer(source, args.latency)
+    base_url = server.start()
+
+    cwd = os.getcwd()
+    workdir = prepare_workdir(args, base_url)
+    os.chdir(workdir)
+    # The worker process has to find the PunyBot package from the temporary working directory.
+    os.environ['PYTHONPATH'] = os.pathsep.join(filter(None, [REPO_ROOT, os.environ.get('PYTHONPATH')]))
+
+    try:
+        api = FakeDiscordAPI(args.discord_latency)
+        plugin = load_plugin(api, base_url)
+
+        from PunyBot.utils import feeds
+        parse_timer = ParseTimer()
+        feeds.feedparser = SimpleNamespace(parse=parse_timer.wrap(feeds.feedparser.parse))
+        feeds.normalize_entries = parse_timer.wrap(feeds.normalize_entries)
+
+        cycles = [run_cycle(plugin, api, source, parse_timer, args) for _ in range(args.cycles + 1)]
+
+        allocations = None
+        if not args.no_allocations:
+            tracemalloc.start()
+            before = tracemalloc.get_traced_memory()[0]
+            run_cycle(plugin, api, source, parse_timer, args)
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            allocations = {'peak_kib': (peak - before) / 1024, 'retained_kib': (current - before) / 1024}
+
+        print_report(cycles, allocations, args)
+        print(f"\nserver requests: {server.requests}, fake Discord API calls: {api.calls}")
+
+        if args.json:
+            with open(os.path.join(cwd, args.json), 'w') as f:
+                json.dump({'args': vars(args), 'cycles': cycles, 'allocations': allocations}, f, indent=2)
+    finally:
+        os.chdir(cwd)
+        server.stop()
+        if not args.keep_workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+        else:
+            print(f"working directory kept at {workdir}")
+
+
+if __name__ == "__main__":
+    main()